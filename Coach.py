@@ -21,6 +21,7 @@ class Coach():
         self.mcts = MCTS(self.game, self.nnet, self.args)
         self.trainExamplesHistory = []    # history of examples from args.numItersForTrainExamplesHistory latest iterations
         self.skipFirstSelfPlay = False    # can be overriden in loadTrainExamples()
+        self.searchStats = {}             # MCTS counters summed over the iteration (if args.mctsStats)
 
     def executeEpisode(self):
         """
@@ -31,7 +32,13 @@ class Coach():
         in trainExamples.
 
         It uses a temp=1 if episodeStep < tempThreshold, and thereafter
-        uses temp=0.
+        uses temp=0. With args.gumbel the action chosen by the Gumbel search
+        is played instead, and its improved policy is the training target.
+
+        With playout cap randomization only a fraction args.playoutCapProb of
+        the moves are searched with numMCTSSims simulations and added to
+        trainExamples, the other moves are only played, after a cheap search
+        of args.numMCTSSimsFast simulations (default numMCTSSims/5).
 
         Returns:
             trainExamples: a list of examples of the form (canonicalBoard,pi,v)
@@ -48,13 +55,25 @@ class Coach():
             canonicalBoard = self.game.getCanonicalForm(board,self.curPlayer)
             temp = int(episodeStep < self.args.tempThreshold)
 
-            pi = self.mcts.getActionProb(canonicalBoard, temp=temp)
-            sym = self.game.getSymmetries(canonicalBoard, pi)
-            for b,p in sym:
-                trainExamples.append([b, self.curPlayer, p, None])
-
-            action = np.random.choice(len(pi), p=pi)
-            board, self.curPlayer = self.game.getNextState(board, self.curPlayer, action)
+            # full search (recorded) or cheap search (only played)
+            fullSearch = np.random.rand() < self.args.get('playoutCapProb', 1)
+            numSims = self.args.numMCTSSims if fullSearch else self.args.get('numMCTSSimsFast', max(1, self.args.numMCTSSims//5))
+            pi = self.mcts.getActionProb(canonicalBoard, temp=temp, numSims=numSims, explore=True)
+            if self.mcts.stats is not None:
+                for key, value in self.mcts.stats.items():
+                    self.searchStats[key] = self.searchStats.get(key, 0) + value
+            if fullSearch:
+                sym = self.game.getSymmetries(canonicalBoard, pi)
+                for b,p in sym:
+                    trainExamples.append([b, self.curPlayer, p, None])
+
+            if self.args.get('gumbel', False):
+                # pi is the improved policy, play the action chosen by sequential halving
+                action = self.mcts.gumbelAction
+            else:
+                action = np.random.choice(len(pi), p=pi)
+            # Copy the board since trainExamples hold views of canonicalBoard
+            board, self.curPlayer = self.game.getNextState(board, self.curPlayer, action, copy=True)
 
             r = self.game.getGameEnded(board, self.curPlayer)
 
@@ -84,6 +103,7 @@ class Coach():
                 for eps in range(self.args.numEps):
                     self.mcts = MCTS(self.game, self.nnet, self.args)   # reset search tree
                     iterationTrainExamples += self.executeEpisode()
+                    self.mcts.close()   # stop the worker processes of the episode's search
     
                     # bookkeeping + plot progress
                     eps_time.update(time.time() - end)
@@ -92,6 +112,9 @@ class Coach():
                                                                                                                total=bar.elapsed_td, eta=bar.eta_td)
                     bar.next()
                 bar.finish()
+                if self.searchStats:
+                    self.printSearchStats()
+                    self.searchStats = {}
 
                 # save the iteration examples to the history 
                 self.trainExamplesHistory.append(iterationTrainExamples)
@@ -121,8 +144,12 @@ class Coach():
             arena = Arena(lambda x: np.argmax(pmcts.getActionProb(x, temp=0)),
                           lambda x: np.argmax(nmcts.getActionProb(x, temp=0)), self.game)
             pwins, nwins, draws = arena.playGames(self.args.arenaCompare)
+            pmcts.close()   # stop the worker processes of the arena searches
+            nmcts.close()
 
             print('NEW/PREV WINS : %d / %d ; DRAWS : %d' % (nwins, pwins, draws))
+            nstats, pstats = nmcts.getTableStats(), pmcts.getTableStats()
+            print('NEW/PREV MCTS NODES : %d / %d ; EVICTED : %d / %d' % (nstats['nodes'], pstats['nodes'], nstats['evicted'], pstats['evicted']))
             if pwins+nwins == 0 or float(nwins)/(pwins+nwins) < self.args.updateThreshold:
                 print('REJECTING NEW MODEL')
                 self.nnet.load_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
@@ -131,6 +158,17 @@ class Coach():
                 self.nnet.save_checkpoint(folder=self.args.checkpoint, filename=self.getCheckpointFile(i))
                 self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='best.pth.tar')                
 
+    def printSearchStats(self):
+        """
+        Prints the MCTS counters of the self-play of the iteration.
+        """
+        stats = MCTS.summarizeStats(self.searchStats)
+        print('MCTS : %d searches, %d sims, %.0f sims/s, avg depth %.1f, avg tree %.0f nodes, %d NN boards (%.1f%% cached)' % (
+            stats['calls'], stats['sims'], stats['simsPerSec'], stats['avgDepth'], stats['avgNodes'], stats['nnBoards'],
+            100*stats['nnCacheHitRate']))
+        print('MCTS TIME : select %.2fs | engine %.2fs | hash %.2fs | NN %.2fs | backup %.2fs | total %.2fs' % (
+            stats['selectTime'], stats['engineTime'], stats['hashTime'], stats['nnTime'], stats['backupTime'], stats['time']))
+
     def getCheckpointFile(self, iteration):
         return 'checkpoint_' + str(iteration) + '.pth.tar'
 
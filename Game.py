@@ -33,12 +33,14 @@ class Game():
         """
         pass
 
-    def getNextState(self, board, player, action):
+    def getNextState(self, board, player, action, copy=False):
         """
         Input:
             board: current board
             player: current player (1 or -1)
             action: action taken by current player
+            copy: if True board must be left unchanged, otherwise the game
+                  may update board in place
 
         Returns:
             nextBoard: board after applying action
@@ -62,8 +64,8 @@ class Game():
     def getGameEnded(self, board, player):
         """
         Input:
-            board: current board
-            player: current player (1 or -1)
+            board: current board, or a canonical board (see getCanonicalForm)
+            player: current player (1 or -1), 1 for a canonical board
 
         Returns:
             r: 0 if game has not ended. 1 if player won, -1 if player lost,
@@ -85,6 +87,11 @@ class Game():
                             of white. When the player is white, we can return
                             board as is. When the player is black, we can invert
                             the colors and return the board.
+                            canonicalBoard must be a board of the game on which
+                            player 1 is the player to move: MCTS calls
+                            getGameEnded, getValidMoves and getNextState on it
+                            with player 1, and these must give the result for
+                            player on board.
         """
         pass
 
@@ -1,38 +1,194 @@
 import math
+import multiprocessing
+import time
 import numpy as np
+from utils import dotdict
 EPS = 1e-8
+INITIAL_NODES = 256 # initial number of rows of the node table (doubled when full)
+INITIAL_DEPTH = 256 # initial length of the search path (doubled when full)
+
+# Search tree and random number generator of a worker process of a root
+# parallel search (see MCTS.getParallelCounts)
+_workerMCTS = None
+_workerRng = None
+
+def _initWorker(game, nnet, args):
+    global _workerMCTS, _workerRng
+    _workerMCTS = MCTS(game, nnet, args)
+    _workerRng = np.random.RandomState()    # seeded from the OS, different in every worker
+
+def _workerCounts(canonicalBoard, numSims, noise):
+    start = _workerMCTS.startStats()
+    counts = _workerMCTS.getCounts(canonicalBoard, numSims, noise, _workerRng)
+    _workerMCTS.finishStats(start)
+    return counts, _workerMCTS.stats
+
+# Time counters of the search (see MCTS.getStats), and the methods of the game
+# and of the neural network timed by each of them
+STATS_GAME_TIMES = {
+    'getNextState': 'engineTime',
+    'getCanonicalForm': 'engineTime',
+    'getValidMoves': 'engineTime',
+    'getGameEnded': 'engineTime',
+    'stringRepresentation': 'hashTime',
+    'getSymmetricForm': 'hashTime',
+    'mirrorBoard': 'hashTime',
+}
+STATS_NNET_TIMES = {
+    'predict': 'nnTime',
+    'predictBatch': 'nnTime',
+}
+
+def _timed(function, stats, key):
+    """
+    Returns function, adding the time spent in each of its calls to stats[key]
+    """
+    def timedFunction(*args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        stats[key] += time.perf_counter() - start
+        return result
+    return timedFunction
+
+class _Timed():
+    """
+    Wraps obj (the game or the neural network), timing the calls of the
+    methods in times (a dict from method name to time counter of stats).
+    """
+    def __init__(self, obj, times, stats):
+        self.obj = obj
+        for name, key in times.items():
+            if hasattr(obj, name):
+                setattr(self, name, _timed(getattr(obj, name), stats, key))
+
+    def __getattr__(self, name):
+        return getattr(self.obj, name)
 
 class MCTS():
     """
     This class handles the MCTS tree.
+
+    Every board s visited by the search is a node of the tree, stored as one
+    row of the node table: the statistics of all actions of the node are
+    contiguous arrays indexed by action, and self.nodes maps s to its row.
+    The child board s reached by every visited action is remembered, so the
+    search only hashes boards of new edges; with args.mctsCacheBoards the
+    boards of the nodes are kept too and the search only calls the game to
+    play new edges.
+
+    If args.mctsMaxNodes is set the node table is bounded: before a simulation
+    could add more nodes than fit, the least recently visited nodes (but not
+    the root) are evicted so the table never holds more than mctsMaxNodes
+    nodes, and the rows of evicted nodes are reused.
+
+    If args.mctsSymmetry is set a board and its mirror image (an equivalent
+    position, see game.getSymmetricForm) are searched as the same node, so
+    they share statistics and neural network evaluations.
+
+    If args.mctsStats is set the search is instrumented: the time spent in
+    selection, game engine calls, hashing, neural network and backup is
+    counted for every call to getActionProb (see getStats). Otherwise the game
+    and the neural network are called directly and nothing is counted.
     """
 
     def __init__(self, game, nnet, args):
         self.game = game
         self.nnet = nnet
         self.args = args
-        self.Qsa = {}       # stores Q values for s,a (as defined in the paper)
-        self.Nsa = {}       # stores #times edge s,a was visited
-        self.Ns = {}        # stores #times board s was visited
-        self.Ps = {}        # stores initial policy (returned by neural net)
+        self.nodes = {}     # maps board s to its node (row of the node table)
+        self.numNodes = 0   # number of rows of the node table in use (including free rows)
+        self.freeNodes = [] # rows of evicted nodes, reused by addNode
+        self.numEvicted = 0 # number of nodes evicted so far
+        self.clock = 0      # number of searches (calls to getActionProb) so far
+        self.pool = None    # worker processes of the root parallel search
+        self.pathNodes = [0]*INITIAL_DEPTH   # nodes of the search path (see search)
+        self.pathActions = [0]*INITIAL_DEPTH # actions taken at the nodes of the search path
+
+        # Node table, one row per node
+        actionSize = self.game.getActionSize()
+        self.Es = np.zeros(INITIAL_NODES, dtype=np.float32)                   # stores game.getGameEnded ended for board s
+        self.Ns = np.zeros(INITIAL_NODES, dtype=np.int64)                     # stores #times board s was visited
+        self.Ps = np.zeros((INITIAL_NODES, actionSize), dtype=np.float32)     # stores initial policy (returned by neural net)
+        self.Vs = np.zeros((INITIAL_NODES, actionSize), dtype=bool)           # stores game.getValidMoves for board s
+        self.Nsa = np.zeros((INITIAL_NODES, actionSize), dtype=np.int32)      # stores #times edge s,a was visited
+        self.Wsa = np.zeros((INITIAL_NODES, actionSize), dtype=np.float32)    # stores total value of edge s,a (Q = Wsa/Nsa)
+        self.Vn = np.zeros(INITIAL_NODES, dtype=np.float32)                   # stores value of board s (returned by neural net)
+        self.keys = np.empty(INITIAL_NODES, dtype=object)                    # stores board s of the node (None for free rows)
+        self.lastVisit = np.zeros(INITIAL_NODES, dtype=np.int64)             # stores the clock of the last search visiting board s
+        self.children = np.empty(INITIAL_NODES, dtype=object)                # stores dict of the child (board s, mirrored) of every visited action a of board s
+        self.boards = np.empty(INITIAL_NODES, dtype=object)                  # stores canonical board of s (if args.mctsCacheBoards)
+        self.cacheBoards = self.args.get('mctsCacheBoards', False)
+        self.symmetry = self.args.get('mctsSymmetry', False)
+        self.gumbelAction = None    # action chosen by sequential halving in the last call to getGumbelProb
+        if self.args.get('gumbel', False) and (self.args.get('numMCTSWorkers', 1) > 1 or self.args.get('mctsTimeBudget')
+                                               or self.args.get('mctsBatchSize', 1) > 1 or self.args.get('mctsEarlyStop', False)):
+            # the Gumbel root search runs its own schedule of simulations, one at a time
+            raise ValueError('args.gumbel can not be combined with numMCTSWorkers, mctsTimeBudget, mctsBatchSize or mctsEarlyStop')
 
-        self.Es = {}        # stores game.getGameEnded ended for board s
-        self.Vs = {}        # stores game.getValidMoves for board s
+        # Instrumentation, counters of the last call to getActionProb
+        self.stats = None
+        if self.args.get('mctsStats', False):
+            self.stats = dict.fromkeys(('calls', 'sims', 'time', 'selectTime', 'engineTime', 'hashTime', 'nnTime', 'backupTime',
+                                        'nnBoards', 'nnCacheHits', 'nnCacheMisses', 'depth', 'nodes'), 0)
+            self.game = _Timed(self.game, STATS_GAME_TIMES, self.stats)
+            self.nnet = _Timed(self.nnet, STATS_NNET_TIMES, self.stats)
+            self.selectAction = _timed(self.selectAction, self.stats, 'selectTime')
+            self.backup = _timed(self.backup, self.stats, 'backupTime')
 
-    def getActionProb(self, canonicalBoard, temp=1):
+    def getActionProb(self, canonicalBoard, temp=1, numSims=None, explore=False):
         """
         This function performs numMCTSSims simulations of MCTS starting from
-        canonicalBoard.
+        canonicalBoard (numSims simulations if given).
+
+        If explore is set (self-play) and args.rootNoise is set, Dirichlet
+        noise is mixed into the root policy (see getRootNoise), the same way
+        whatever the number of workers.
+
+        If args.numMCTSWorkers is more than 1 the simulations are split among
+        that many worker processes, each searching canonicalBoard with its own
+        tree (root parallel search), and their root visit counts are summed.
+        Each worker also mixes its own Dirichlet noise into the root policy
+        with weight args.mctsWorkerNoise, so the workers search different
+        trees, in self-play and in arena games alike.
+
+        If args.gumbel is set the root is searched with Gumbel sampling and
+        sequential halving instead (see getGumbelProb): probs is then the
+        improved policy whatever temp is, and the action to play is left in
+        self.gumbelAction.
 
         Returns:
             probs: a policy vector where the probability of the ith action is
                    proportional to Nsa[(s,a)]**(1./temp)
         """
-        for i in range(self.args.numMCTSSims):
-            self.search(canonicalBoard)
+        start = self.startStats()
+        if numSims is None:
+            numSims = self.args.numMCTSSims
+        workers = self.args.get('numMCTSWorkers', 1)
+        gumbel = self.args.get('gumbel', False)
+        noise = None
+        if explore and self.args.get('rootNoise', False) and not gumbel:
+            noise = self.getRootNoise(canonicalBoard)
+        if gumbel:
+            probs = self.getGumbelProb(canonicalBoard, numSims)
+        elif workers > 1:
+            counts, workerStats = self.getParallelCounts(canonicalBoard, workers, numSims, noise)
+        else:
+            counts = self.getCounts(canonicalBoard, numSims, noise)
+        self.finishStats(start)
+        if workers > 1 and not gumbel and self.stats is not None:
+            # the workers count the simulations, evaluations and nodes
+            for key in self.stats:
+                if key not in ('calls', 'time'):
+                    self.stats[key] += sum(stats[key] for stats in workerStats)
 
-        s = self.game.stringRepresentation(canonicalBoard)
-        counts = [self.Nsa[(s,a)] if (s,a) in self.Nsa else 0 for a in range(self.game.getActionSize())]
+        if gumbel:
+            return probs
+
+        if not any(counts):
+            # no action visited (e.g. the time budget ran out after the first
+            # simulation, which only expanded the root): all valid moves are
+            # equally good
+            counts = self.game.getValidMoves(canonicalBoard, 1).tolist()
 
         if temp==0:
             bestA = np.argmax(counts)
@@ -46,84 +202,713 @@ class MCTS():
         return probs
 
 
-    def search(self, canonicalBoard):
+    def startStats(self):
+        """
+        Resets the counters of self.stats (if args.mctsStats is set) for a new
+        call to getActionProb.
+
+        Returns:
+            start: what finishStats needs to complete the counters
+        """
+        if self.stats is None:
+            return None
+        for key in self.stats:
+            self.stats[key] = 0
+        cache = getattr(self.nnet, 'cache', None)   # evaluation cache of the network, if any
+        if cache is None:
+            return (time.perf_counter(), None, 0, 0)
+        return (time.perf_counter(), cache, cache.hits, cache.misses)
+
+    def finishStats(self, start):
+        """
+        Completes the counters of self.stats (if args.mctsStats is set) at the
+        end of a call to getActionProb started with startStats.
+        """
+        if self.stats is None:
+            return
+        startTime, cache, hits, misses = start
+        self.stats['calls'] = 1
+        self.stats['time'] = time.perf_counter() - startTime
+        self.stats['nodes'] = len(self.nodes)
+        if cache is not None:
+            self.stats['nnCacheHits'] = cache.hits - hits
+            self.stats['nnCacheMisses'] = cache.misses - misses
+
+    def getCounts(self, canonicalBoard, numSims, noise=None, rng=None):
+        """
+        This function performs numSims simulations of MCTS starting from
+        canonicalBoard, or as many as fit in args.mctsTimeBudget seconds if it
+        is set. With args.mctsEarlyStop the search stops early once its result
+        can no longer change (see isDecided). If noise (see getRootNoise) is
+        given, it is mixed into the root policy with weight
+        args.dirichletEpsilon during these simulations. If rng (a numpy
+        RandomState, given in the workers of a root parallel search) is given,
+        Dirichlet noise drawn from it is then mixed in with weight
+        args.mctsWorkerNoise.
+
+        Returns:
+            counts: a list of the visit counts of the actions of canonicalBoard
+        """
+        canonicalBoard, s, mirrored = self.prepareRoot(canonicalBoard)
+
+        rootPs = None
+        workerEpsilon = self.args.get('mctsWorkerNoise', 0.25) if rng is not None else 0
+        if (noise is not None or workerEpsilon > 0) and numSims > 0:
+            if s not in self.nodes:
+                # expand the root first
+                self.makeRoom(s, 1)
+                self.search(canonicalBoard, s)
+                numSims -= 1
+            root = self.nodes[s]
+            if self.Es[root]==0:
+                # mix the noise into the policy of the valid moves
+                rootPs = self.Ps[root].copy()
+                valids = self.Vs[root]
+                ps = rootPs
+                if noise is not None:
+                    if mirrored:
+                        noise = self.game.mirrorPolicy(noise)
+                    epsilon = self.args.get('dirichletEpsilon', 0.25)
+                    ps = (1-epsilon)*ps + epsilon*noise
+                if workerEpsilon > 0:
+                    workerNoise = np.zeros(len(ps))
+                    workerNoise[valids] = rng.dirichlet([self.args.get('dirichletAlpha', 0.3)]*int(valids.sum()))
+                    ps = (1-workerEpsilon)*ps + workerEpsilon*workerNoise
+                self.Ps[root] = ps
+
+        # with a time budget search until it expires (numSims is ignored),
+        # with early stopping stop once the most visited root action can no
+        # longer be overtaken by the simulations left
+        budget = self.args.get('mctsTimeBudget')
+        earlyStop = self.args.get('mctsEarlyStop', False)
+        batchSize = self.args.get('mctsBatchSize', 1)
+        start = time.time()
+        sims = 0
+        while True:
+            if budget:
+                now = time.time()
+                if sims > 0 and now - start >= budget:
+                    break
+                remaining = sims*(budget - (now - start))/max(now - start, EPS)    # at the current rate
+            else:
+                remaining = numSims - sims
+                if remaining <= 0:
+                    break
+            if earlyStop and sims > 0 and self.isDecided(s, remaining):
+                break
+            if batchSize > 1:
+                # descend up to batchSize paths at a time, evaluating their leaves
+                # in one batched call to the neural network
+                size = batchSize if budget else min(batchSize, remaining)
+                self.makeRoom(s, size)
+                sims += self.searchBatch(canonicalBoard, size)
+            else:
+                self.makeRoom(s, 1)
+                self.search(canonicalBoard, s)
+                sims += 1
+
+        if self.stats is not None:
+            self.stats['sims'] += sims
+        node = self.nodes.get(s)
+        if rootPs is not None:
+            self.Ps[node] = rootPs
+        if node is None:
+            return [0]*self.game.getActionSize()
+        if mirrored:
+            return self.game.mirrorPolicy(self.Nsa[node]).tolist()
+        return self.Nsa[node].tolist()
+
+    def prepareRoot(self, canonicalBoard):
+        """
+        Starts a new search from canonicalBoard: with args.mctsSymmetry the
+        symmetric form of canonicalBoard is searched.
+
+        Returns:
+            rootBoard: the board to search (canonicalBoard or its mirror image)
+            s: game.stringRepresentation(rootBoard)
+            mirrored: True if rootBoard is the mirror image of canonicalBoard,
+                      the policy of rootBoard is then mirrored back
+        """
+        self.clock += 1
+        mirrored = False
+        if self.symmetry:
+            # search the symmetric form of the root, its counts are mirrored back
+            canonicalBoard, s, mirrored = self.game.getSymmetricForm(canonicalBoard)
+        else:
+            s = self.game.stringRepresentation(canonicalBoard)
+        if self.cacheBoards and s not in self.nodes:
+            # the root may be added to the node table: keep a copy of it, since
+            # the caller may change its board in place after the search
+            canonicalBoard = np.copy(canonicalBoard)
+            canonicalBoard.flags.writeable = False
+        root = self.nodes.get(s)
+        if root is not None:
+            self.lastVisit[root] = self.clock
+        return canonicalBoard, s, mirrored
+
+    def makeRoom(self, s, newNodes):
+        """
+        With args.mctsMaxNodes, evicts the least recently visited nodes (never
+        board s, the root of the search) if adding newNodes more nodes would
+        take the node table over mctsMaxNodes nodes. A quarter of the table is
+        freed at once so evictions stay rare.
+        """
+        maxNodes = self.args.get('mctsMaxNodes')
+        if maxNodes and len(self.nodes) + newNodes > maxNodes:
+            self.evictNodes(max(1, min(maxNodes - newNodes, 3*maxNodes//4)), s)
+
+    def getGumbelProb(self, canonicalBoard, numSims):
+        """
+        This function performs numSims simulations of MCTS starting from
+        canonicalBoard, choosing the root actions with Gumbel sampling and
+        sequential halving (Danihelka et al., Policy improvement by planning
+        with Gumbel) instead of the upper confidence bound, which keeps the
+        policy improvement valid with few simulations.
+
+        The args.gumbelTopK (default 16) valid actions with the highest
+        logit + Gumbel noise are searched, the simulations being split evenly
+        between ceil(log2(k)) phases: in each phase every remaining action is
+        visited equally often, then the better half (by logit + Gumbel noise +
+        sigma(Q)) is kept. Below the root the usual upper confidence bound is
+        used. The action left with the best score is the one to play, it is
+        stored in self.gumbelAction (None for a terminal root).
+
+        Returns:
+            probs: the improved policy softmax(logit + sigma(completed Q)), the
+                   policy target for training
+        """
+        canonicalBoard, s, mirrored = self.prepareRoot(canonicalBoard)
+        actionSize = self.game.getActionSize()
+        self.gumbelAction = None
+
+        sims = 0
+        if s not in self.nodes:
+            # expand the root first
+            self.makeRoom(s, 1)
+            self.search(canonicalBoard, s)
+            sims += 1
+        node = self.nodes[s]
+        self.lastVisit[node] = self.clock
+        valids = np.flatnonzero(self.Vs[node])
+        if len(valids) == 0:
+            # terminal root
+            return [0]*actionSize
+
+        logits = np.log(self.Ps[node, valids].astype(np.float64) + EPS)
+        gumbels = np.random.gumbel(size=len(valids))
+        k = max(1, min(self.args.get('gumbelTopK', 16), len(valids), numSims - sims))
+        remaining = np.argsort(-(gumbels + logits), kind='stable')[:k]    # indexes into valids
+        phases = max(1, int(math.ceil(math.log2(k))))
+        budget = numSims - sims
+
+        for phase in range(phases):
+            visits = max(1, budget // (phases*len(remaining)))
+            # visit the remaining actions in turn (while simulations are left)
+            for i in range(min(visits*len(remaining), numSims - sims)):
+                a = valids[remaining[i % len(remaining)]]
+                self.makeRoom(s, 1)
+                child_s, child_key = self.getChild(node, canonicalBoard, a)
+                v = self.search(child_s, child_key)
+                self.Wsa[node, a] += v
+                self.Nsa[node, a] += 1
+                self.Ns[node] += 1
+                sims += 1
+            if len(remaining) > 1:
+                # keep the better half
+                scores = (gumbels + logits + self.getSigmaQ(node, valids))[remaining]
+                remaining = remaining[np.argsort(-scores, kind='stable')[:(len(remaining) + 1)//2]]
+
+        if self.stats is not None:
+            self.stats['sims'] += sims
+
+        sigmaQ = self.getSigmaQ(node, valids)
+        action = np.zeros(actionSize)
+        action[valids[remaining[np.argmax((gumbels + logits + sigmaQ)[remaining])]]] = 1
+        probs = np.zeros(actionSize)
+        improved = logits + sigmaQ
+        improved = np.exp(improved - improved.max())
+        probs[valids] = improved/improved.sum()
+        if mirrored:
+            action = self.game.mirrorPolicy(action)
+            probs = self.game.mirrorPolicy(probs)
+        self.gumbelAction = int(np.argmax(action))
+        return probs.tolist()
+
+    def getSigmaQ(self, node, valids):
+        """
+        Returns sigma(completed Q) of the valid actions of node (an array of
+        actions): Q = Wsa/Nsa for visited actions, the value estimate of node
+        mixing the network value with the Q of the visited actions for the
+        others, normalized to [0, 1] then scaled by (args.gumbelCVisit +
+        max Nsa) * args.gumbelCScale (defaults 50 and 0.1).
+        """
+        nsa = self.Nsa[node, valids].astype(np.float64)
+        wsa = self.Wsa[node, valids].astype(np.float64)
+        ps = self.Ps[node, valids].astype(np.float64)
+        visited = nsa > 0
+        q = np.divide(wsa, nsa, out=np.zeros(len(nsa)), where=visited)
+        # value of unvisited actions
+        totalVisits = nsa.sum()
+        vMix = self.Vn[node]
+        if totalVisits > 0 and ps[visited].sum() > 0:
+            weightedQ = (ps[visited]*q[visited]).sum()/ps[visited].sum()
+            vMix = (vMix + totalVisits*weightedQ)/(1 + totalVisits)
+        q[~visited] = vMix
+        q = (q - q.min())/max(q.max() - q.min(), EPS)
+        return (self.args.get('gumbelCVisit', 50) + nsa.max())*self.args.get('gumbelCScale', 0.1)*q
+
+    def isDecided(self, s, remaining):
+        """
+        Returns True if the search of board s can stop: the root is terminal or
+        the most visited action of s can not be overtaken (nor tied) by another
+        valid action in remaining more simulations.
+        """
+        node = self.nodes.get(s)
+        if node is None:
+            return False
+        if self.Es[node]!=0:
+            return True
+        if self.Ns[node] == 0:
+            return False    # no action visited yet
+        counts = self.Nsa[node][self.Vs[node]]
+        if len(counts) < 2:
+            return True     # forced move
+        second, best = np.partition(counts, -2)[-2:]
+        return best - second > remaining
+
+    def getRootNoise(self, canonicalBoard):
+        """
+        Returns:
+            noise: Dirichlet noise (args.dirichletAlpha) over the valid moves of
+                   canonicalBoard as a policy vector (0 for invalid moves),
+                   mixed into the root policy of self-play searches
+        """
+        valids = np.asarray(self.game.getValidMoves(canonicalBoard, 1), dtype=bool)
+        noise = np.zeros(len(valids))
+        noise[valids] = np.random.dirichlet([self.args.get('dirichletAlpha', 0.3)]*int(valids.sum()))
+        return noise
+
+    def getParallelCounts(self, canonicalBoard, workers, numSims, noise=None):
+        """
+        This function splits numSims simulations of MCTS starting from
+        canonicalBoard among worker processes. Each worker keeps its own tree
+        (from one call to the next) and random number generator, used to add
+        its own Dirichlet noise to the root policy (on top of noise, shared by
+        all workers) so the workers explore differently. The worker processes
+        are forked from this one (sharing the neural network) the first time
+        they are needed, and run until close is called.
+
+        Returns:
+            counts: a list of the visit counts of the actions of canonicalBoard,
+                    summed over the workers
+            workerStats: the counters of the search of each worker (see
+                         getStats, None if args.mctsStats is not set)
+        """
+        if self.pool is None:
+            workerArgs = dotdict(self.args)
+            workerArgs['numMCTSWorkers'] = 1
+            context = multiprocessing.get_context('fork')
+            self.pool = context.Pool(workers, initializer=_initWorker, initargs=(self.game, self.nnet, workerArgs))
+        # the first numSims % workers workers run one more simulation
+        workerSims = [numSims//workers + (i < numSims % workers) for i in range(workers)]
+        tasks = [(canonicalBoard, sims, noise) for sims in workerSims if sims > 0] or [(canonicalBoard, 0, noise)]
+        results = self.pool.starmap(_workerCounts, tasks)
+        workerCounts, workerStats = zip(*results)
+        return np.sum(workerCounts, axis=0).tolist(), workerStats
+
+    def close(self):
+        """
+        Terminates the worker processes of the root parallel search, if any.
+        """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def __del__(self):
+        self.close()
+
+    def search(self, canonicalBoard, s=None):
         """
-        This function performs one iteration of MCTS. It is recursively called
-        till a leaf node is found. The action chosen at each node is one that
-        has the maximum upper confidence bound as in the paper.
+        This function performs one iteration of MCTS. It descends the tree from
+        canonicalBoard till a leaf node is found. The action chosen at each node
+        is one that has the maximum upper confidence bound as in the paper.
 
         Once a leaf node is found, the neural network is called to return an
         initial policy P and a value v for the state. This value is propagated
         up the search path. In case the leaf node is a terminal state, the
-        outcome is propagated up the search path. The values of Ns, Nsa, Qsa are
+        outcome is propagated up the search path. The values of Ns, Nsa, Wsa are
         updated.
 
+        The search path is kept in the preallocated lists self.pathNodes and
+        self.pathActions instead of recursing once per move, so long games do
+        not run into the recursion limit.
+
         NOTE: the return values are the negative of the value of the current
         state. This is done since v is in [-1,1] and if v is the value of a
         state for the current player, then its value is -v for the other player.
 
+        Input:
+            s: game.stringRepresentation(canonicalBoard) if already known
+
         Returns:
             v: the negative of the value of the current canonicalBoard
         """
 
-        s = self.game.stringRepresentation(canonicalBoard)
+        if s is None:
+            s = self.game.stringRepresentation(canonicalBoard)
+        pathNodes = self.pathNodes
+        pathActions = self.pathActions
+        depth = 0
+        onPath = set()  # nodes of the search path
+
+        while True:
+            node = self.nodes.get(s)
+
+            if node is None:
+                node = self.addNode(s, canonicalBoard)
+                self.Es[node] = self.game.getGameEnded(canonicalBoard, 1)
+                if self.Es[node]!=0:
+                    # terminal node
+                    v = -self.Es[node]
+                    break
+
+                # leaf node
+                ps, v = self.nnet.predict(canonicalBoard)
+                if self.stats is not None:
+                    self.stats['nnBoards'] += 1
+                v = np.asarray(v).item()    # nets may return v as a 1 element array
+                self.expandNode(node, canonicalBoard, ps)
+                self.Vn[node] = v
+                v = -v
+                break
+
+            self.lastVisit[node] = self.clock
+
+            if self.Es[node]!=0:
+                # terminal node
+                v = -self.Es[node]
+                break
+
+            if node in onPath:
+                # the position repeats on the search path (the game went round
+                # a cycle, e.g. a wall was placed back), scored as a draw
+                v = 0
+                break
+            onPath.add(node)
 
-        if s not in self.Es:
-            self.Es[s] = self.game.getGameEnded(canonicalBoard, 1)
-        if self.Es[s]!=0:
-            # terminal node
-            return -self.Es[s]
+            a = self.selectAction(node)
+            if depth == len(pathNodes):
+                pathNodes.extend([0]*depth)
+                pathActions.extend([0]*depth)
+            pathNodes[depth] = node
+            pathActions[depth] = a
+            depth += 1
+            canonicalBoard, s = self.getChild(node, canonicalBoard, a)
+
+        # propagate the value up the search path, from the leaf to the root
+        if self.stats is not None:
+            self.stats['depth'] += depth
+            start = time.perf_counter()
+        Wsa, Nsa, Ns = self.Wsa, self.Nsa, self.Ns
+        for i in range(depth - 1, -1, -1):
+            node = pathNodes[i]
+            a = pathActions[i]
+            Wsa[node, a] += v
+            Nsa[node, a] += 1
+            Ns[node] += 1
+            v = -v
+        if self.stats is not None:
+            self.stats['backupTime'] += time.perf_counter() - start
+        return v
+
+    def searchBatch(self, canonicalBoard, batchSize):
+        """
+        This function performs up to batchSize iterations of MCTS at once.
+        Paths are descended from canonicalBoard one after the other as in
+        search, but the leaf nodes found are not evaluated right away: a virtual
+        loss (args.virtualLoss, default 1) is added to the edges of every path
+        so the following paths explore different parts of the tree, then the
+        neural network evaluates all leaf nodes in one call to predictBatch and
+        the values are propagated up their paths (removing the virtual loss).
+
+        Terminal leaf nodes are propagated right away. The descent stops early
+        if a path ends in a leaf node already waiting for its evaluation, since
+        every following path would end there too.
+
+        Returns:
+            sims: the number of iterations performed (at least 1)
+        """
+        virtualLoss = self.args.get('virtualLoss', 1)
+        leaves = []     # boards of the leaf nodes to evaluate
+        leafNodes = []  # their nodes
+        leafPaths = []  # the (node, action) edges of their paths
+        sims = 0
+
+        while sims + len(leaves) < batchSize:
+            # descend to a leaf node, adding virtual loss to the edges taken
+            board = canonicalBoard
+            s = self.game.stringRepresentation(board)
+            path = []
+            onPath = set()  # nodes of the path
+            while True:
+                node = self.nodes.get(s)
+                if node is None or self.Es[node]!=0 or node in leafNodes or node in onPath:
+                    break
+                onPath.add(node)
+                self.lastVisit[node] = self.clock
+                a = self.selectAction(node)
+                self.Nsa[node, a] += virtualLoss
+                self.Wsa[node, a] -= virtualLoss
+                self.Ns[node] += virtualLoss
+                path.append((node, a))
+                board, s = self.getChild(node, board, a)
+
+            if node is not None and node in leafNodes:
+                # already waiting for its evaluation, undo the virtual loss
+                self.backup(path, None, virtualLoss)
+                break
+
+            if node in onPath:
+                # the position repeats, scored as a draw (see search)
+                if self.stats is not None:
+                    self.stats['depth'] += len(path)
+                self.backup(path, 0, virtualLoss)
+                sims += 1
+                continue
+
+            if node is None:
+                node = self.addNode(s, board)
+                self.Es[node] = self.game.getGameEnded(board, 1)
+            if self.Es[node]!=0:
+                # terminal node
+                if self.stats is not None:
+                    self.stats['depth'] += len(path)
+                self.backup(path, -self.Es[node], virtualLoss)
+                sims += 1
+                continue
 
-        if s not in self.Ps:
             # leaf node
-            self.Ps[s], v = self.nnet.predict(canonicalBoard)
-            valids = self.game.getValidMoves(canonicalBoard, 1)
-            self.Ps[s] = self.Ps[s]*valids      # masking invalid moves
-            sum_Ps_s = np.sum(self.Ps[s])
-            if sum_Ps_s > 0:
-                self.Ps[s] /= sum_Ps_s    # renormalize
-            else:
-                # if all valid moves were masked make all valid moves equally probable
-                
-                # NB! All valid moves may be masked if either your NNet architecture is insufficient or you've get overfitting or something else.
-                # If you have got dozens or hundreds of these messages you should pay attention to your NNet and/or training process.   
-                print("All valid moves were masked, do workaround.")
-                self.Ps[s] = self.Ps[s] + valids
-                self.Ps[s] /= np.sum(self.Ps[s])
-
-            self.Vs[s] = valids
-            self.Ns[s] = 0
-            return -v
-
-        valids = self.Vs[s]
-        cur_best = -float('inf')
-        best_act = -1
-
-        # pick the action with the highest upper confidence bound
-        for a in range(self.game.getActionSize()):
-            if valids[a]:
-                if (s,a) in self.Qsa:
-                    u = self.Qsa[(s,a)] + self.args.cpuct*self.Ps[s][a]*math.sqrt(self.Ns[s])/(1+self.Nsa[(s,a)])
-                else:
-                    u = self.args.cpuct*self.Ps[s][a]*math.sqrt(self.Ns[s] + EPS)     # Q = 0 ?
-
-                if u > cur_best:
-                    cur_best = u
-                    best_act = a
-
-        a = best_act
-        next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
+            if self.stats is not None:
+                self.stats['depth'] += len(path)
+            leaves.append(board)
+            leafNodes.append(node)
+            leafPaths.append(path)
+
+        if leaves:
+            pis, vs = self.nnet.predictBatch(leaves)
+            if self.stats is not None:
+                self.stats['nnBoards'] += len(leaves)
+            vs = np.asarray(vs).reshape(len(leaves))
+            for board, node, path, ps, v in zip(leaves, leafNodes, leafPaths, pis, vs):
+                self.expandNode(node, board, ps)
+                self.Vn[node] = v
+                self.backup(path, -float(v), virtualLoss)
+        return sims + len(leaves)
+
+    def getChild(self, node, canonicalBoard, a):
+        """
+        Returns the canonical board reached from node (of canonicalBoard) by
+        action a, and its string representation. Both come from the node table
+        if the edge was visited before and the child board is cached, otherwise
+        the game plays the action (and the child string representation of the
+        edge is remembered).
+
+        With args.mctsSymmetry the child is the symmetric form of the board
+        reached (see game.getSymmetricForm), so a board and its mirror image
+        are the same node.
+
+        Returns:
+            next_s: the canonical board of the child
+            next_key: game.stringRepresentation(next_s)
+        """
+        children = self.children[node]
+        child = children.get(a)     # (next_key, mirrored) of a visited edge
+        if child is not None and self.cacheBoards:
+            childNode = self.nodes.get(child[0])
+            if childNode is not None:
+                return self.boards[childNode], child[0]
+        next_s, next_player = self.game.getNextState(canonicalBoard, 1, a, copy=True)
         next_s = self.game.getCanonicalForm(next_s, next_player)
+        if child is None:
+            if self.symmetry:
+                next_s, next_key, mirrored = self.game.getSymmetricForm(next_s)
+            else:
+                next_key, mirrored = self.game.stringRepresentation(next_s), False
+            children[a] = (next_key, mirrored)
+            return next_s, next_key
+        next_key, mirrored = child
+        if mirrored:
+            next_s = self.game.mirrorBoard(next_s)
+        return next_s, next_key
 
-        v = self.search(next_s)
+    def backup(self, path, v, virtualLoss):
+        """
+        Propagates the value v up the (node, action) edges of path (from the
+        last edge to the first) and removes the virtual loss added to them.
+        If v is None only the virtual loss is removed.
 
-        if (s,a) in self.Qsa:
-            self.Qsa[(s,a)] = (self.Nsa[(s,a)]*self.Qsa[(s,a)] + v)/(self.Nsa[(s,a)]+1)
-            self.Nsa[(s,a)] += 1
+        Input:
+            v: the value of the last edge for the player choosing its action
+               (the negative of the value of the leaf node)
+        """
+        for node, a in reversed(path):
+            self.Nsa[node, a] -= virtualLoss
+            self.Wsa[node, a] += virtualLoss
+            self.Ns[node] -= virtualLoss
+            if v is not None:
+                self.Wsa[node, a] += v
+                self.Nsa[node, a] += 1
+                self.Ns[node] += 1
+                v = -v
+
+    def selectAction(self, node):
+        """
+        Returns:
+            a: the valid action of node with the highest upper confidence bound
+        """
+        # computed for all actions of the node at once (Q = 0 for unvisited edges)
+        nsa = self.Nsa[node]
+        ns = self.Ns[node]
+        qsa = np.divide(self.Wsa[node], nsa, out=np.zeros(len(nsa)), where=nsa>0)
+        sqrtNs = math.sqrt(ns) if ns > 0 else math.sqrt(EPS)
+        u = qsa + self.args.cpuct*self.Ps[node]*sqrtNs/(1+nsa)
+        u[~self.Vs[node]] = -np.inf    # never pick invalid moves
+        return int(np.argmax(u))
+
+    def expandNode(self, node, canonicalBoard, ps):
+        """
+        Stores the initial policy ps returned by the neural network for the
+        leaf node of canonicalBoard, masked to its valid moves.
+        """
+        valids = self.game.getValidMoves(canonicalBoard, 1)
+        ps = ps*valids      # masking invalid moves
+        sum_Ps_s = np.sum(ps)
+        if sum_Ps_s > 0:
+            ps /= sum_Ps_s    # renormalize
+        else:
+            # if all valid moves were masked make all valid moves equally probable
+
+            # NB! All valid moves may be masked if either your NNet architecture is insufficient or you've get overfitting or something else.
+            # If you have got dozens or hundreds of these messages you should pay attention to your NNet and/or training process.
+            print("All valid moves were masked, do workaround.")
+            ps = ps + valids
+            ps /= np.sum(ps)
+
+        self.Ps[node] = ps
+        self.Vs[node] = valids
+
+    def addNode(self, s, canonicalBoard=None):
+        """
+        Adds board s to the node table with empty statistics, reusing the row
+        of an evicted node or growing the node table if it is full.
+        canonicalBoard is kept in the node table if args.mctsCacheBoards is set.
 
+        Returns:
+            node: the row of the node table for s
+        """
+        if self.freeNodes:
+            node = self.freeNodes.pop()
+            self.Es[node] = 0
+            self.Ns[node] = 0
+            self.Ps[node] = 0
+            self.Vs[node] = False
+            self.Nsa[node] = 0
+            self.Wsa[node] = 0
+            self.Vn[node] = 0
         else:
-            self.Qsa[(s,a)] = v
-            self.Nsa[(s,a)] = 1
+            if self.numNodes == len(self.Ns):
+                # double the rows, but not past args.mctsMaxNodes (which makeRoom
+                # keeps the number of nodes under)
+                rows = 2*len(self.Ns)
+                maxNodes = self.args.get('mctsMaxNodes')
+                if maxNodes and len(self.Ns) < maxNodes:
+                    rows = min(rows, maxNodes)
+                for name in ('Es', 'Ns', 'Ps', 'Vs', 'Nsa', 'Wsa', 'Vn', 'keys', 'lastVisit', 'children', 'boards'):
+                    table = getattr(self, name)
+                    grown = np.zeros((rows,) + table.shape[1:], dtype=table.dtype)
+                    grown[:len(table)] = table
+                    setattr(self, name, grown)
+            node = self.numNodes
+            self.numNodes += 1
+        self.nodes[s] = node
+        self.keys[node] = s
+        self.children[node] = {}
+        self.boards[node] = canonicalBoard if self.cacheBoards else None
+        self.lastVisit[node] = self.clock
+        return node
+
+    def evictNodes(self, keep, s=None):
+        """
+        Evicts the least recently visited nodes from the node table until at
+        most keep nodes remain, never evicting board s. Their rows are reused by
+        addNode, the nodes are added again (with empty statistics) if the
+        search reaches them later.
+        """
+        excess = len(self.nodes) - keep
+        if excess <= 0:
+            return
+        nodes = np.fromiter(self.nodes.values(), dtype=np.int64, count=len(self.nodes))
+        if s in self.nodes:
+            nodes = nodes[nodes != self.nodes[s]]
+            excess = min(excess, len(nodes))
+        evicted = nodes[np.argpartition(self.lastVisit[nodes], excess - 1)[:excess]]
+        for node in evicted.tolist():
+            del self.nodes[self.keys[node]]
+            self.keys[node] = None
+            self.children[node] = None
+            self.boards[node] = None
+        self.freeNodes.extend(evicted.tolist())
+        self.numEvicted += excess
+
+    def getStats(self):
+        """
+        Returns:
+            stats: a dict with the counters of the last call to getActionProb
+                   (see summarizeStats), None if args.mctsStats is not set
+        """
+        if self.stats is None:
+            return None
+        return MCTS.summarizeStats(self.stats)
 
-        self.Ns[s] += 1
-        return -v
+    @staticmethod
+    def summarizeStats(stats):
+        """
+        Input:
+            stats: counters of calls to getActionProb (those of getStats, or
+                   the sums of several of them): the number of calls, of
+                   simulations, the seconds spent in total, in selectAction,
+                   in game engine calls (getNextState, getCanonicalForm,
+                   getValidMoves, getGameEnded), in stringRepresentation, in
+                   the neural network and in backup, the number of boards
+                   evaluated by the neural network, the number of them found
+                   and not found in the evaluation cache of the network, the
+                   sum of the depths of the simulations and the number of nodes
+                   of the tree after each call
+
+        Returns:
+            summary: a copy of stats with the simulations per second, average
+                     depth of a simulation, average tree size and evaluation
+                     cache hit rate added
+        """
+        summary = dict(stats)
+        summary['simsPerSec'] = stats['sims']/max(stats['time'], EPS)
+        summary['avgDepth'] = stats['depth']/max(stats['sims'], 1)
+        summary['avgNodes'] = stats['nodes']/max(stats['calls'], 1)
+        summary['nnCacheHitRate'] = stats['nnCacheHits']/max(stats['nnCacheHits'] + stats['nnCacheMisses'], 1)
+        return summary
+
+    def getTableStats(self):
+        """
+        Returns:
+            stats: a dict with the occupancy of the node table: the number of
+                   nodes, of allocated rows, the node cap (args.mctsMaxNodes,
+                   None if unbounded), the number of nodes evicted so far and
+                   the memory used by the node table in bytes
+        """
+        return {
+            'nodes': len(self.nodes),
+            'rows': len(self.Ns),
+            'maxNodes': self.args.get('mctsMaxNodes'),
+            'evicted': self.numEvicted,
+            'bytes': sum(getattr(self, name).nbytes for name in ('Es', 'Ns', 'Ps', 'Vs', 'Nsa', 'Wsa', 'Vn', 'keys', 'lastVisit', 'children', 'boards')),
+        }
@@ -1,3 +1,5 @@
+import numpy as np
+
 class NeuralNet():
     """
     This class specifies the base NeuralNet class. To define your own neural
@@ -36,6 +38,22 @@ class NeuralNet():
         """
         pass
 
+    def predictBatch(self, boards):
+        """
+        Input:
+            boards: a list of boards in their canonical form.
+
+        Returns:
+            pis: a numpy array of the policy vectors of the boards, one row per
+                 board
+            vs: a numpy array of the values of the boards
+
+        The default implementation calls predict for every board, override it
+        to evaluate all boards in one pass of the network.
+        """
+        pis, vs = zip(*[self.predict(board) for board in boards])
+        return np.array(pis), np.array(vs).reshape(len(boards))
+
     def save_checkpoint(self, folder, filename):
         """
         Saves the current neural network (with its parameters) in
@@ -0,0 +1,312 @@
+from __future__ import print_function
+import sys
+sys.path.append('..')
+from .KindoGame import KindoGame
+from .KindoLogic import Board
+from .KindoBitLogic import BitBoard
+import numpy as np
+
+'''
+Author: Daniel Scalettar (https://github.com/scalettar/)
+Date: March, 2020
+'''
+
+class BatchedKindoGame():
+    '''
+    This class steps a batch of B Kindo games at once.
+    It holds the boards of all games as a single (B x n x n x 9) array (same
+    board format as KindoGame) and the player to move in each game, and applies
+    the rules of KindoLogic.Board to every game with vectorized NumPy operations,
+    so many concurrent games share one engine call (and one NN batch).
+    '''
+    # Tile and player property indexes and game constants (see KindoLogic.Board)
+    OWNER = Board.OWNER
+    WALL_DIRECTION = Board.WALL_DIRECTION
+    HAS_DOT = Board.HAS_DOT
+    IS_UNWALLABLE = Board.IS_UNWALLABLE
+    P_ID = Board.P_ID
+    P_MOVES_CURRENT = Board.P_MOVES_CURRENT
+    P_MOVES_NEXT = Board.P_MOVES_NEXT
+    P_NUM_TILES_OWNED = Board.P_NUM_TILES_OWNED
+    MOVES_MAX = Board.MOVES_MAX
+    MOVES_NEXT_BASE = Board.MOVES_NEXT_BASE
+    # Wall directions 1: N, 2: E, 3: S, 4: W
+    _WALL_DIRECTIONS = np.arange(1, 5)
+    # Walled in gates for each board size n (see _get_walled_in_gates)
+    _WALLED_IN_GATES = {}
+
+    def __init__(self, n=5, numGames=1):
+        # Board dimensions n x n
+        self.n = n
+        # Number of games B
+        self.numGames = numGames
+        self.game = KindoGame(n)
+        # Boards (B x n x n x 9) and player to move (B) of every game
+        self.boards = None
+        self.players = None
+        self.getInitBoards()
+
+    def getActionSize(self):
+        """
+        Returns:
+            actionSize: number of all possible actions (see KindoGame.getActionSize)
+        """
+        return self.game.getActionSize()
+
+    def getInitBoards(self):
+        """
+        Starts all B games from the initial board with player 1 to move
+
+        Returns:
+            boards: the B starting boards
+        """
+        self.boards = np.repeat(self.game.getInitBoard()[np.newaxis], self.numGames, axis=0)
+        self.players = np.ones(self.numGames, dtype=int)
+        return self.boards
+
+    def setBoards(self, boards, players):
+        """
+        Input:
+            boards: B boards, either n x n x 9 boards or packed boards (see
+                    KindoGame.packBoard)
+            players: player to move in each game (1 or -1)
+        """
+        if boards.dtype == np.int8:
+            boards = Board.unpack(boards)
+        self.boards = np.array(boards, dtype=int)
+        self.players = np.array(players, dtype=int)
+        self.numGames = len(self.boards)
+
+    def getPackedBoards(self):
+        """
+        Returns:
+            packedBoards: the B boards in the packed int8 format (see
+                          KindoGame.packBoard)
+        """
+        return Board.pack(self.boards)
+
+    def step(self, actions):
+        """
+        Input:
+            actions: action taken by the player to move in each game
+
+        Returns:
+            validMoves: B valid move masks for the new players to move
+            ended: B game results for the new players to move (see getGameEnded)
+            canonicalBoards: B canonical boards for the new players to move
+        """
+        self.getNextStates(actions)
+        return (self.getValidMoves(), self.getGameEnded(), self.getCanonicalForms())
+
+    def getNextStates(self, actions):
+        """
+        Applies the action of the player to move in every game in place (same
+        rules as Board.execute_move, the final "no legal moves" action makes no
+        changes)
+
+        Input:
+            actions: action taken by the player to move in each game
+
+        Returns:
+            boards: the B boards after applying actions
+            players: player who makes the next move in each game
+        """
+        n = self.n
+        games = np.arange(self.numGames)
+        actions = np.asarray(actions)
+        owner = self.boards[:, :, :, self.OWNER]
+        wall = self.boards[:, :, :, self.WALL_DIRECTION]
+        dot = self.boards[:, :, :, self.HAS_DOT]
+        # Player records stored at Player 1's and Player 2's King tiles (B x 2 x 4)
+        kings = Board._get_layout(n)[2]
+        players = self.boards[:, kings[0], kings[1], 5:]
+        # Records of the current (c) and opposing (o) player of each game
+        c = np.where(players[:, 0, self.P_ID] == self.players, 0, 1)
+        o = 1 - c
+        currentID = players[games, c, self.P_ID]
+        opposingID = players[games, o, self.P_ID]
+        # Extract move parameters x, y, and w
+        moved = actions != self.getActionSize() - 1
+        x = actions // (n * 5)
+        y = actions % (n * 5) // 5
+        w = actions % 5
+        x[~moved] = 0
+        y[~moved] = 0
+        # Placing Wall Actions
+        placing = np.flatnonzero(moved & (w != 0))
+        wall[placing, x[placing], y[placing]] = w[placing]
+        # Capturing Actions
+        capturing = np.flatnonzero(moved & (w == 0))
+        targetOwner = owner[capturing, x[capturing], y[capturing]]
+        enemy = capturing[targetOwner != 0]
+        # Award opponent a bonus move if the captured enemy tile has a dot
+        bonus = enemy[(dot[enemy, x[enemy], y[enemy]] == True) \
+            & (players[enemy, o[enemy], self.P_MOVES_NEXT] < self.MOVES_MAX)]
+        players[bonus, o[bonus], self.P_MOVES_NEXT] += 1
+        # Current player captures tile
+        owner[capturing, x[capturing], y[capturing]] = currentID[capturing]
+        dot[capturing, x[capturing], y[capturing]] = True
+        wall[enemy, x[enemy], y[enemy]] = 0
+        players[games[moved], c[moved], self.P_MOVES_CURRENT] -= 1
+        players[capturing, c[capturing], self.P_NUM_TILES_OWNED] += 1
+        players[enemy, o[enemy], self.P_NUM_TILES_OWNED] -= 1
+        if enemy.size:
+            # Check if any other tiles were detached from opponent's King tile
+            opponentOwned = owner[enemy] == opposingID[enemy, np.newaxis, np.newaxis]
+            king = np.zeros(opponentOwned.shape, dtype=bool)
+            king[o[enemy] == 0, n-1, 0] = True
+            king[o[enemy] == 1, 0, n-1] = True
+            connected = self._spread(king & opponentOwned, opponentOwned, opponentOwned, opponentOwned, opponentOwned)
+            connectedTilesNum = connected.sum(axis=(1, 2))
+            detached = connectedTilesNum < players[enemy, o[enemy], self.P_NUM_TILES_OWNED]
+            massCapture = enemy[detached]
+            if massCapture.size:
+                # Mass capture detached tiles (swap from opponent to current player)
+                swapped = opponentOwned[detached] & ~connected[detached]
+                owner[massCapture] = np.where(swapped, currentID[massCapture, np.newaxis, np.newaxis], owner[massCapture])
+                dot[massCapture] &= ~swapped
+                wall[massCapture] *= ~swapped
+                # Award bonus move to current player for detaching opponent tiles
+                bonus = massCapture[players[massCapture, c[massCapture], self.P_MOVES_NEXT] < self.MOVES_MAX]
+                players[bonus, c[bonus], self.P_MOVES_NEXT] += 1
+                # Update number of tiles owned for both players
+                numMassCaptured = players[massCapture, o[massCapture], self.P_NUM_TILES_OWNED] \
+                    - connectedTilesNum[detached]
+                players[massCapture, c[massCapture], self.P_NUM_TILES_OWNED] += numMassCaptured
+                players[massCapture, o[massCapture], self.P_NUM_TILES_OWNED] -= numMassCaptured
+        # Switch to the opposing player if the current player has no moves left
+        switch = np.flatnonzero(moved & (players[games, c, self.P_MOVES_CURRENT] < 1))
+        s = o[switch]
+        players[switch, s, self.P_MOVES_CURRENT] = players[switch, s, self.P_MOVES_NEXT]
+        players[switch, s, self.P_MOVES_NEXT] = self.MOVES_NEXT_BASE
+        # Remove dots from new current player's tiles
+        dot[switch] &= owner[switch] != opposingID[switch, np.newaxis, np.newaxis]
+        # Update players
+        self.boards[:, kings[0], kings[1], 5:] = players
+        self.players[switch] = opposingID[switch]
+        return (self.boards, self.players)
+
+    def getValidMoves(self):
+        """
+        Returns:
+            validMoves: B binary vectors of length self.getActionSize(), 1 for
+                        moves that are valid for the player to move in each
+                        game (see Board.get_legal_moves_mask)
+        """
+        n = self.n
+        validMoves = np.zeros((self.numGames, self.getActionSize()), dtype=int)
+        legalMoves = validMoves[:, :-1].reshape((self.numGames, n, n, 5))
+        owned = self.boards[:, :, :, self.OWNER] == self.players[:, np.newaxis, np.newaxis]
+        wall = self.boards[:, :, :, self.WALL_DIRECTION]
+        # Capturing: tile not owned by player with an adjacent tile owned by player
+        # which is not blocked by a wall on the tile
+        capture = np.zeros(owned.shape, dtype=bool)
+        capture[:, 1:, :] |= owned[:, :-1, :] & (wall[:, 1:, :] != 1)
+        capture[:, :, :-1] |= owned[:, :, 1:] & (wall[:, :, :-1] != 2)
+        capture[:, :-1, :] |= owned[:, 1:, :] & (wall[:, :-1, :] != 3)
+        capture[:, :, 1:] |= owned[:, :, :-1] & (wall[:, :, 1:] != 4)
+        legalMoves[:, :, :, 0] = capture & ~owned
+        # Placing walls: owned, wallable tiles, any wall not already on the tile
+        wallable = owned & (self.boards[:, :, :, self.IS_UNWALLABLE] == 0)
+        legalMoves[:, :, :, 1:] = wallable[..., np.newaxis] & (wall[..., np.newaxis] != self._WALL_DIRECTIONS)
+        # No legal moves found (in Kindo this should only occur when the game is over)
+        validMoves[:, -1] = ~legalMoves.any(axis=(1, 2, 3))
+        return validMoves
+
+    def getGameEnded(self):
+        """
+        Returns:
+            r: B game results for the player to move in each game (see
+               KindoGame.getGameEnded): 0 if game has not ended, 1 if player
+               won, -1 if player lost
+        """
+        n = self.n
+        owner = self.boards[:, :, :, self.OWNER]
+        win = np.where(self.players == 1, 1, -1)
+        # Check if player 1 captured player 2's King tile, then the opposite
+        kingCaptured = np.where(owner[:, 0, n-1] == 1, win,
+            np.where(owner[:, n-1, 0] == -1, -win, 0))
+        # Check if player 1 walled in player 2, then the opposite
+        walledIn = np.where(self._walled_in(1), win,
+            np.where(self._walled_in(-1), -win, 0))
+        return np.where((kingCaptured == 1) | (walledIn == 1), 1,
+            np.where((kingCaptured == -1) | (walledIn == -1), -1, 0))
+
+    def getCanonicalForms(self):
+        """
+        Returns:
+            canonicalBoards: B canonical boards for the player to move in each
+                             game, equal to KindoGame.getCanonicalForm of each
+                             game (owner of all tiles and the ids of both
+                             players negated for player -1, see
+                             Board.swap_players)
+        """
+        canonicalBoards = np.array(self.boards)
+        swapped = self.players == -1
+        swappedBoards = canonicalBoards[swapped]
+        Board.swap_players(swappedBoards)
+        canonicalBoards[swapped] = swappedBoards
+        return canonicalBoards
+
+    def _walled_in(self, winner):
+        '''
+        Returns for each game whether winner walled in the other player (see
+        BitBoard.walled_in_masks)
+        '''
+        n = self.n
+        walledIn = np.zeros(self.numGames, dtype=bool)
+        enemy = self.boards[:, :, :, self.OWNER] == winner
+        wall = self.boards[:, :, :, self.WALL_DIRECTION]
+        # Fast pre-check: a wall cut needs a wall in both of its gates
+        gates = self._get_walled_in_gates(n)[winner]
+        check = np.ones(self.numGames, dtype=bool)
+        for gate in gates:
+            hit = np.zeros(self.numGames, dtype=bool)
+            for w, mask in gate:
+                hit |= (enemy & (wall == w) & mask).any(axis=(1, 2))
+            check &= hit
+        games = np.flatnonzero(check)
+        if games.size:
+            # Tiles owned by winner cannot be entered from the side their wall faces
+            blocked = enemy[games, :, :, np.newaxis] & (wall[games, :, :, np.newaxis] == self._WALL_DIRECTIONS)
+            start = np.zeros(blocked.shape[:3], dtype=bool)
+            if winner == 1:
+                start[:, 0, n-1] = True
+                reached = self._spread(start, *np.moveaxis(~blocked, 3, 0))[:, n-1, 0]
+            else:
+                start[:, n-1, 0] = True
+                reached = self._spread(start, *np.moveaxis(~blocked, 3, 0))[:, 0, n-1]
+            walledIn[games] = ~reached
+        return walledIn
+
+    @classmethod
+    def _spread(cls, reached, openFromAbove, openFromRight, openFromBelow, openFromLeft):
+        '''
+        Expands the reached tiles of each game (B x n x n) into adjacent tiles
+        that can be entered from that side until nothing changes
+        '''
+        while True:
+            grown = np.array(reached)
+            grown[:, 1:, :] |= reached[:, :-1, :] & openFromAbove[:, 1:, :]
+            grown[:, :, :-1] |= reached[:, :, 1:] & openFromRight[:, :, :-1]
+            grown[:, :-1, :] |= reached[:, 1:, :] & openFromBelow[:, :-1, :]
+            grown[:, :, 1:] |= reached[:, :, :-1] & openFromLeft[:, :, 1:]
+            if np.array_equal(grown, reached):
+                return reached
+            reached = grown
+
+    @classmethod
+    def _get_walled_in_gates(cls, n):
+        '''
+        Returns the walled in gates of BitBoard._walled_in_gates as n x n masks,
+        computing them on first use: {winner: (((wall direction, tiles), ...) for
+        each of the two gates)}
+        '''
+        if n not in cls._WALLED_IN_GATES:
+            def tiles(mask):
+                return np.array([mask >> i & 1 for i in range(n * n)], dtype=bool).reshape((n, n))
+            gates = {}
+            for winner, (d1, m1, d2, m2, d3, m3, d4, m4) in BitBoard._walled_in_gates(n).items():
+                gates[winner] = (((d1, tiles(m1)), (d2, tiles(m2))), ((d3, tiles(m3)), (d4, tiles(m4))))
+            cls._WALLED_IN_GATES[n] = gates
+        return cls._WALLED_IN_GATES[n]
@@ -0,0 +1,464 @@
+import numpy as np
+
+'''
+Author: Daniel Scalettar (https://github.com/scalettar/)
+Date: March, 2020
+'''
+
+class BitBoard():
+    '''
+    Bitboard implementation of the Kindo board.
+    Drop-in alternative to KindoLogic.Board which stores the state as integer
+    bitmasks instead of an n x n x 9 array, so rule checks become shift-and-mask
+    operations instead of Python loops over every tile.
+
+    Bit layout:
+        tile (x, y) is stored in bit x * n + y (same flattened index used by
+        Board._get_connected_tiles), e.g. for n = 5 (5 x 5 board):
+                0	1	2	3	4
+        	-----------------------
+        0	|	0	1	2	3	4
+        1	|	5	6	7	8	9
+        2	|	10	11	12	13	14
+        3	|	15	16	17	18	19
+        4	|	20	21	22	23	24
+
+    Board state:
+        owner[0] / owner[1]: tiles owned by player 1 / player -1
+        walls[w]: tiles with a wall facing direction w (1: N, 2: E, 3: S, 4: W)
+        dots, kings, unwallable: tiles with the corresponding property set
+        players[0] / players[1]: player record stored at Player 1's / Player 2's
+            King tile (playerID, movesCurrent, movesNext, numTilesOwned)
+
+    The tiles property converts to and from the n x n x 9 array used by
+    KindoGame and the neural network, so the two representations are lossless.
+    '''
+    # Tile and player property indexes in the n x n x 9 array (see KindoLogic.Board)
+    TILE_PROPERTIES = 9
+    OWNER = 0
+    WALL_DIRECTION = 1
+    HAS_DOT = 2
+    IS_KING = 3
+    IS_UNWALLABLE = 4
+    PLAYER_ID = 5
+    MOVES_CURRENT = 6
+    MOVES_NEXT = 7
+    NUM_TILES_OWNED = 8
+    # Indexes into a player record
+    P_ID = 0
+    P_MOVES_CURRENT = 1
+    P_MOVES_NEXT = 2
+    P_NUM_TILES_OWNED = 3
+    # Game constants (see KindoLogic.Board)
+    MOVES_MAX = 4
+    MOVES_NEXT_BASE = 2
+    INIT_P1_MOVES = 1
+    INIT_P2_MOVES = 0
+    INIT_P1_MOVES_NEXT = 2
+    INIT_P2_MOVES_NEXT = 2
+    # Conversion between tile properties and masks, one entry per mask in the order
+    # p1 owner, p2 owner, wall N, wall E, wall S, wall W, dot, King, unwallable
+    _TILES_TO_PLANES_INDEX = [0, 0, 1, 1, 1, 1, 2, 3, 4]
+    _TILES_TO_PLANES_VALUE = [1, -1, 1, 2, 3, 4, 1, 1, 1]
+    _PLANES_TO_TILES = np.array([
+        [1, 0, 0, 0, 0],
+        [-1, 0, 0, 0, 0],
+        [0, 1, 0, 0, 0],
+        [0, 2, 0, 0, 0],
+        [0, 3, 0, 0, 0],
+        [0, 4, 0, 0, 0],
+        [0, 0, 1, 0, 0],
+        [0, 0, 0, 1, 0],
+        [0, 0, 0, 0, 1]])
+    # Per board size masks, computed once by _masks(n)
+    _MASKS = {}
+    # Per board size walled in gates, computed once by _walled_in_gates(n)
+    _GATES = {}
+
+    def __init__(self, n):
+        """
+        Initializes starting board state
+        """
+        self.n = n
+        (self.FULL, self.NOT_FIRST_COL, self.NOT_LAST_COL, self.P1_KING, self.P2_KING,
+            self.DIAGONAL, self._moves) = self._masks(n)
+        # Tiles owned by player 1 and player -1
+        self.owner = [self.P1_KING, self.P2_KING]
+        # Index 0 is unused so wall direction w is stored at walls[w]
+        self.walls = [0, 0, 0, 0, 0]
+        self.dots = 0
+        self.kings = self.P1_KING | self.P2_KING
+        self.unwallable = self.DIAGONAL | self.kings
+        # Player records (playerID, movesCurrent, movesNext, numTilesOwned)
+        self.players = [
+            [1, self.INIT_P1_MOVES, self.INIT_P1_MOVES_NEXT, 1],
+            [-1, self.INIT_P2_MOVES, self.INIT_P2_MOVES_NEXT, 1]]
+        # Undo stack for make_move / unmake_move
+        self.history = []
+
+    @classmethod
+    def wrap(cls, tiles):
+        '''
+        Returns a BitBoard loaded from an existing n x n x 9 array without writing
+        the initial board state first (see KindoLogic.Board.wrap, unlike Board the
+        bitmasks do not share memory with tiles)
+        '''
+        b = cls.__new__(cls)
+        b.n = tiles.shape[0]
+        (b.FULL, b.NOT_FIRST_COL, b.NOT_LAST_COL, b.P1_KING, b.P2_KING,
+            b.DIAGONAL, b._moves) = cls._masks(b.n)
+        b.tiles = tiles
+        # Undo stack for make_move / unmake_move
+        b.history = []
+        return b
+
+    @classmethod
+    def _masks(cls, n):
+        '''
+        Returns the constant masks for an n x n board, computing them on first use:
+        (full board, not first column, not last column, p1 King, p2 King, diagonal, moves)
+        moves[i][w] is the move (x, y, w) for the tile at flattened index i
+        '''
+        if n not in cls._MASKS:
+            full = (1 << (n * n)) - 1
+            firstCol = 0
+            lastCol = 0
+            diagonal = 0
+            for i in range(n):
+                firstCol |= 1 << (i * n)
+                lastCol |= 1 << (i * n + n - 1)
+                diagonal |= 1 << (i * n + i)
+            moves = [[(i // n, i % n, w) for w in range(5)] for i in range(n * n)]
+            cls._MASKS[n] = (full, full & ~firstCol, full & ~lastCol,
+                1 << (n * (n - 1)), 1 << (n - 1), diagonal, moves)
+        return cls._MASKS[n]
+
+    @property
+    def tiles(self):
+        '''
+        Returns the board as an n x n x 9 array (same format as KindoLogic.Board)
+        '''
+        n = self.n
+        size = n * n
+        numBytes = (size + 7) // 8
+        masks = self.owner + self.walls[1:] + [self.dots, self.kings, self.unwallable]
+        data = np.frombuffer(b''.join([m.to_bytes(numBytes, 'little') for m in masks]), dtype=np.uint8)
+        planes = np.unpackbits(data.reshape((len(masks), numBytes)), axis=1, bitorder='little')[:, :size]
+        tiles = np.zeros((size, self.TILE_PROPERTIES), dtype=int)
+        tiles[:, :self.PLAYER_ID] = np.dot(planes.T.astype(int), self._PLANES_TO_TILES)
+        tiles = tiles.reshape((n, n, self.TILE_PROPERTIES))
+        tiles[n-1, 0, self.PLAYER_ID:] = self.players[0]
+        tiles[0, n-1, self.PLAYER_ID:] = self.players[1]
+        return tiles
+
+    @tiles.setter
+    def tiles(self, tiles):
+        '''
+        Loads the board from an n x n x 9 array (same format as KindoLogic.Board)
+        '''
+        n = self.n
+        flat = tiles.reshape((n * n, self.TILE_PROPERTIES))
+        # One row per mask, all packed in a single call
+        planes = flat[:, self._TILES_TO_PLANES_INDEX] == self._TILES_TO_PLANES_VALUE
+        packed = np.packbits(planes.T, axis=1, bitorder='little')
+        masks = [int.from_bytes(row.tobytes(), 'little') for row in packed]
+        self.owner = masks[0:2]
+        self.walls = [0] + masks[2:6]
+        self.dots, self.kings, self.unwallable = masks[6:9]
+        self.players = [
+            [int(v) for v in tiles[n-1, 0, self.PLAYER_ID:]],
+            [int(v) for v in tiles[0, n-1, self.PLAYER_ID:]]]
+
+    def _spread(self, mask):
+        '''
+        Returns all tiles horizontally or vertically adjacent to a tile in mask
+        '''
+        n = self.n
+        return ((mask << n) | (mask >> n) | ((mask << 1) & self.NOT_FIRST_COL)
+            | ((mask >> 1) & self.NOT_LAST_COL)) & self.FULL
+
+    @classmethod
+    def fill(cls, n, seed, mask):
+        '''
+        Returns all tiles in mask connected to a tile in seed through
+        horizontally or vertically adjacent tiles in mask (flood fill)
+        '''
+        full, notFirstCol, notLastCol = cls._masks(n)[:3]
+        connected = seed & mask
+        while True:
+            grown = (connected | (((connected << n) | (connected >> n)
+                | ((connected << 1) & notFirstCol) | ((connected >> 1) & notLastCol)) & full)) & mask
+            if grown == connected:
+                return connected
+            connected = grown
+
+    def _capturable(self, player):
+        '''
+        Returns tiles not owned by player that have an adjacent tile owned by
+        player which is not blocked by a wall on the tile (same rule as
+        Board._check_valid_adjacent)
+        '''
+        n = self.n
+        own = self.owner[0 if player == 1 else 1]
+        walls = self.walls
+        # Owned tile above (x - 1) and no wall facing up
+        capturable = (own << n) & ~walls[1]
+        # Owned tile to right (y + 1) and no wall facing right
+        capturable |= (own >> 1) & self.NOT_LAST_COL & ~walls[2]
+        # Owned tile below (x + 1) and no wall facing down
+        capturable |= (own >> n) & ~walls[3]
+        # Owned tile to left (y - 1) and no wall facing left
+        capturable |= (own << 1) & self.NOT_FIRST_COL & ~walls[4]
+        return capturable & ~own & self.FULL
+
+    def get_legal_moves(self, player):
+        '''
+        Returns all the legal moves for the player in the given board state
+        '''
+        moves = self._moves
+        # Capturing tiles adjacent to an owned tile not blocked by a wall
+        legalMoves = [moves[i][0] for i in self._bits(self._capturable(player))]
+        # Placing walls on owned, wallable tiles (not already facing that direction)
+        wallable = self.owner[0 if player == 1 else 1] & ~self.unwallable
+        for w in range(1, 5):
+            legalMoves += [moves[i][w] for i in self._bits(wallable & ~self.walls[w])]
+        return legalMoves
+
+    def get_legal_moves_mask(self, player, out=None):
+        '''
+        Returns the legal moves for the player as a flattened action mask
+        (see KindoLogic.Board.get_legal_moves_mask)
+        '''
+        size = self.n * self.n
+        if out is None:
+            out = np.zeros(size * 5 + 1, dtype=int)
+        wallable = self.owner[0 if player == 1 else 1] & ~self.unwallable
+        masks = [self._capturable(player)] + [wallable & ~self.walls[w] for w in range(1, 5)]
+        numBytes = (size + 7) // 8
+        data = np.frombuffer(b''.join([m.to_bytes(numBytes, 'little') for m in masks]), dtype=np.uint8)
+        planes = np.unpackbits(data.reshape((5, numBytes)), axis=1, bitorder='little')[:, :size]
+        out[:-1].reshape((size, 5))[:] = planes.T
+        # No legal moves found (in Kindo this should only occur when the game is over)
+        out[-1] = not any(masks)
+        return out
+
+    def _bits(self, mask):
+        '''
+        Returns the indexes of the set bits in mask
+        '''
+        indexes = []
+        while mask:
+            low = mask & -mask
+            indexes.append(low.bit_length() - 1)
+            mask ^= low
+        return indexes
+
+    def make_move(self, move, player):
+        '''
+        Executes given move in place (same as execute_move) and records the
+        masks and player records it may change so unmake_move can revert it
+        Returns the player who makes the next move
+        '''
+        self.history.append((self.owner[:], self.walls[:], self.dots,
+            self.players[0][:], self.players[1][:]))
+        return self.execute_move(move, player)
+
+    def unmake_move(self):
+        '''
+        Reverts the last move executed with make_move
+        '''
+        owner, walls, self.dots, p1, p2 = self.history.pop()
+        self.owner = owner
+        self.walls = walls
+        self.players = [p1, p2]
+
+    def execute_move(self, move, player):
+        '''
+        Executes given move where move is in the format (x, y, w)
+        (see KindoLogic.Board.execute_move)
+        '''
+        # Get appropriate player info given player
+        c = 0 if self.players[0][self.P_ID] == player else 1
+        o = 1 - c
+        currentPlayer = self.players[c]
+        opposingPlayer = self.players[o]
+        (x, y, w) = move
+        bit = 1 << (x * self.n + y)
+        if w != 0: # Placing Wall Action
+            for d in range(1, 5):
+                self.walls[d] &= ~bit
+            self.walls[w] |= bit
+            currentPlayer[self.P_MOVES_CURRENT] -= 1
+        else: # Capturing Action
+            # Owner masks are indexed by player id, not by record
+            cur = 0 if currentPlayer[self.P_ID] == 1 else 1
+            opp = 1 - cur
+            if not ((self.owner[0] | self.owner[1]) & bit): # Tile at x, y is neutral
+                self.owner[cur] |= bit
+                self.dots |= bit
+                currentPlayer[self.P_MOVES_CURRENT] -= 1
+                currentPlayer[self.P_NUM_TILES_OWNED] += 1
+            else: # Tile at x, y is owned by opposing player
+                # Check if tile has a dot and award opponent a bonus move if true
+                if self.dots & bit and opposingPlayer[self.P_MOVES_NEXT] < self.MOVES_MAX:
+                    opposingPlayer[self.P_MOVES_NEXT] += 1
+                # Current player captures tile
+                self.owner[opp] &= ~bit
+                self.owner[cur] |= bit
+                self.dots |= bit
+                for d in range(1, 5):
+                    self.walls[d] &= ~bit
+                currentPlayer[self.P_MOVES_CURRENT] -= 1
+                currentPlayer[self.P_NUM_TILES_OWNED] += 1
+                opposingPlayer[self.P_NUM_TILES_OWNED] -= 1
+                # Check if any other tiles were detached from opponent's King tile
+                connected = self._get_connected_tiles(opposingPlayer[self.P_ID])
+                connectedTilesNum = bin(connected).count('1')
+                if connectedTilesNum < opposingPlayer[self.P_NUM_TILES_OWNED]:
+                    # Mass capture detached tiles (swap from opponent to current player)
+                    detached = self.owner[opp] & ~connected
+                    self.owner[opp] &= connected
+                    self.owner[cur] |= detached
+                    self.dots &= ~detached
+                    for d in range(1, 5):
+                        self.walls[d] &= ~detached
+                    # Award bonus move to current player for detaching opponent tiles
+                    if currentPlayer[self.P_MOVES_NEXT] < self.MOVES_MAX:
+                        currentPlayer[self.P_MOVES_NEXT] += 1
+                    # Update number of tiles owned for both players
+                    numMassCaptured = opposingPlayer[self.P_NUM_TILES_OWNED] - connectedTilesNum
+                    currentPlayer[self.P_NUM_TILES_OWNED] += numMassCaptured
+                    opposingPlayer[self.P_NUM_TILES_OWNED] -= numMassCaptured
+        # Determine which player is making the next move
+        if currentPlayer[self.P_MOVES_CURRENT] < 1:
+            currentPlayer, opposingPlayer = opposingPlayer, currentPlayer
+            currentPlayer[self.P_MOVES_CURRENT] = currentPlayer[self.P_MOVES_NEXT]
+            currentPlayer[self.P_MOVES_NEXT] = self.MOVES_NEXT_BASE
+            # Remove dots from new current player's tiles
+            self.dots &= ~self.owner[0 if currentPlayer[self.P_ID] == 1 else 1]
+        return currentPlayer[self.P_ID]
+
+    def _get_connected_tiles(self, player):
+        '''
+        Returns a mask of all tiles connected to player's King tile
+        '''
+        own = self.owner[0 if player == 1 else 1]
+        # Start from the King tile of the player record with a matching playerID
+        if player == self.players[0][self.P_ID]:
+            return self.fill(self.n, self.P1_KING, own)
+        return self.fill(self.n, self.P2_KING, own)
+
+    def king_captured(self, player):
+        '''
+        Checks if a King tile has been captured
+        If yes, returns winning player (1 or -1)
+        Else returns 0
+        '''
+        # Player owning P1_KING: the playerID of the player record stored on it
+        # (-1 on the canonical form for player -1)
+        p = self.players[0][self.P_ID]
+        own, other = self.owner[::p]
+        # Check if that player captured the other player's King tile
+        if own & self.P2_KING:
+            return 1 if player == p else -1
+        # Check if the other player captured that player's King tile
+        if other & self.P1_KING:
+            return 1 if player == -p else -1
+        return 0
+
+    def walled_in(self, player):
+        '''
+        Checks if a player has been walled in (impossible to ever capture enemy King)
+        If yes, returns winning player (1 or -1)
+        Else returns 0
+        '''
+        # walled_in_masks takes player 1 as the player owning P1_KING (see king_captured)
+        p = self.players[0][self.P_ID]
+        return self.walled_in_masks(self.n, self.owner[::p], self.walls, player * p)
+
+    @classmethod
+    def walled_in_masks(cls, n, owner, walls, player):
+        '''
+        Checks if a player has been walled in given the owner and walls masks
+        (see walled_in), works for any board size n
+        A player is walled in if the enemy King tile cannot be reached from the
+        player's King tile by capturing one tile at a time, where a tile owned by
+        the enemy cannot be captured from the side its wall is facing
+        '''
+        gates = cls._walled_in_gates(n)
+        # Check if player 1 has walled in player 2, then if player 2 has walled in player 1
+        for winner, enemy in ((1, owner[0]), (-1, owner[1])):
+            # Fast pre-check: every wall cut has to cross both gates (see _walled_in_gates)
+            d1, m1, d2, m2, d3, m3, d4, m4 = gates[winner]
+            if not (enemy & ((walls[d1] & m1) | (walls[d2] & m2))) \
+                or not (enemy & ((walls[d3] & m3) | (walls[d4] & m4))):
+                continue
+            if cls._walled_in_reach(n, winner, enemy, walls):
+                return 1 if player == winner else -1
+        return 0
+
+    @classmethod
+    def _walled_in_reach(cls, n, winner, enemy, walls):
+        '''
+        Returns True if the enemy King tile cannot be reached from the King tile of
+        the player walled in by winner (enemy: tiles owned by winner)
+        '''
+        full, notFirstCol, notLastCol, p1King, p2King = cls._masks(n)[:5]
+        start, target = (p2King, p1King) if winner == 1 else (p1King, p2King)
+        # Tiles that can be entered from the tile above / right / below / left
+        openFromAbove = full & ~(enemy & walls[1])
+        openFromRight = notLastCol & ~(enemy & walls[2])
+        openFromBelow = full & ~(enemy & walls[3])
+        openFromLeft = notFirstCol & ~(enemy & walls[4])
+        reached = start
+        # Expand the reachable tiles until the target is reached or nothing changes
+        while not reached & target:
+            grown = reached | ((reached << n) & openFromAbove) | ((reached >> 1) & openFromRight) \
+                | ((reached >> n) & openFromBelow) | ((reached << 1) & openFromLeft)
+            if grown == reached:
+                return True
+            reached = grown
+        return False
+
+    @classmethod
+    def _walled_in_gates(cls, n):
+        '''
+        Returns the walls one of which any wall cut must contain, computing them on
+        first use: {winner: (wall direction, tiles, wall direction, tiles) for each
+        of the two gates}
+        Walling in a King means every path to the enemy King is blocked, so each of
+        the two edge-disjoint paths along the border between the Kings (e.g. for
+        player 2: row 0 then column 0, and column n-1 then row n-1) needs a wall
+        where it leaves the walled in region, facing back towards the King
+        '''
+        if n not in cls._GATES:
+            def tiles(coordinates):
+                mask = 0
+                for x, y in coordinates:
+                    mask |= 1 << (x * n + y)
+                return mask
+            border = range(1, n)
+            cls._GATES[n] = {
+                # Player 1 walls in player 2 (King at (0, n-1)) with walls facing N or E
+                1: (2, tiles((0, y - 1) for y in border), 1, tiles((x, 0) for x in border),
+                    1, tiles((x, n - 1) for x in border), 2, tiles((n - 1, y - 1) for y in border)),
+                # Player 2 walls in player 1 (King at (n-1, 0)) with walls facing S or W
+                -1: (4, tiles((n - 1, y) for y in border), 3, tiles((x - 1, n - 1) for x in border),
+                    3, tiles((x - 1, 0) for x in border), 4, tiles((0, y) for y in border))}
+        return cls._GATES[n]
+
+    def get_tilesOwned_dif(self, player):
+        '''
+        Returns the difference in tiles owned by player compared to the other player
+        '''
+        c = 0 if self.players[0][self.P_ID] == player else 1
+        return self.players[c][self.P_NUM_TILES_OWNED] - self.players[1 - c][self.P_NUM_TILES_OWNED]
+
+    def swap_all_tile_owners(self):
+        '''
+        Swaps the ownership of all tiles and the player ids on the board
+        (canonical form for player -1, see KindoLogic.Board.swap_players)
+        '''
+        self.owner = [self.owner[1], self.owner[0]]
+        for record in self.players:
+            record[self.P_ID] *= -1
@@ -3,6 +3,7 @@ import sys
 sys.path.append('..')
 from Game import Game
 from .KindoLogic import Board
+from .KindoBitLogic import BitBoard
 import numpy as np
 
 '''
@@ -41,9 +42,16 @@ class KindoGame(Game):
         False: " "
     }
     
-    def __init__(self, n=5):
+    def __init__(self, n=5, bitboard=False):
         # Board dimensions n x n
         self.n = n
+        # Board engine (both use the same n x n x 9 array format for boards)
+        # Board: array based engine, BitBoard: bitmask based engine
+        # BitBoard is for engine level use (make_move / unmake_move on a Board
+        # from getBoard, as in perft), not a speedup for self-play or MCTS: the
+        # other methods convert the array to bitmasks and back in every call,
+        # which is slower than the array engine
+        self.Board = BitBoard if bitboard else Board
         # Number of different types of tiles a player can have
         # 0: No wall
         # 1: Wall facing up
@@ -58,7 +66,7 @@ class KindoGame(Game):
             startBoard: a representation of the board (ideally this is the form
                         that will be the input to your neural network)
         """
-        b = Board(self.n)
+        b = self.Board(self.n)
         return np.array(b.tiles)
 
     def getBoardSize(self):
@@ -99,12 +107,14 @@ class KindoGame(Game):
         # without placing any walls
         return self.n * self.n * self.tileTypes + 1
 
-    def getNextState(self, board, player, action):
+    def getNextState(self, board, player, action, copy=False):
         """
         Input:
             board: current board
             player: current player (1 or -1)
             action: action taken by current player
+            copy: if True board is left unchanged, otherwise board may be
+                  updated in place (callers must use the returned nextBoard)
 
         Returns:
             nextBoard: board after applying action
@@ -114,18 +124,39 @@ class KindoGame(Game):
         if action == self.getActionSize() - 1:
             # No valid actions, in Kindo this means the game must be over so make no changes
             return (board, player)
-        # Create a copy of the current board
-        b = Board(self.n)
-        b.tiles = np.copy(board)
-        # Get move (x, y, w) from flattened action index
-        x = int(action / (self.n * self.tileTypes))
-        y = int((action % (self.n * self.tileTypes)) / self.tileTypes)
-        w = (action % (self.n * self.tileTypes)) % self.tileTypes
-        move = (x, y, w)
+        # Only copy the current board if requested
+        b = self.getBoard(np.copy(board) if copy else board)
         # Execute move
-        currentPlayerID = b.execute_move(move, player)
+        currentPlayerID = b.execute_move(self.getMove(action), player)
         # Return updated state and current player
         return (b.tiles, currentPlayerID)
+
+    def getBoard(self, board):
+        """
+        Input:
+            board: current board
+
+        Returns:
+            b: Board object for board which can be searched in place with
+               make_move / unmake_move instead of copying board for every
+               action (the array engine shares memory with board). Its caches
+               (e.g. the connected tiles of Board) start empty and only pay
+               off for the moves made on this Board object
+        """
+        return self.Board.wrap(board)
+
+    def getMove(self, action):
+        """
+        Input:
+            action: flattened action index (see getActionSize)
+
+        Returns:
+            move: move (x, y, w) used by Board
+        """
+        x = int(action / (self.n * self.tileTypes))
+        y = int((action % (self.n * self.tileTypes)) / self.tileTypes)
+        w = (action % (self.n * self.tileTypes)) % self.tileTypes
+        return (x, y, w)
         
     def getValidMoves(self, board, player):
         """
@@ -138,37 +169,26 @@ class KindoGame(Game):
                         moves that are valid from the current board and player,
                         0 for invalid moves
         """
-        # Array of valid moves to return, initialize to all false (0)
-        validMoves = [0] * self.getActionSize()
-        # Create a copy of the current board
-        b = Board(self.n)
-        b.tiles = np.copy(board)
-        # Find the legal (valid) moves
-        legalMoves = b.get_legal_moves(player)
-        # No legal moves found (in Kindo this should only occur when the game is over)
-        if len(legalMoves) == 0:
-            validMoves[-1] = 1 # last move (action) index means no other moves are valid
-            return np.array(validMoves)
-        # Create flattened array of valid moves (actions) from legalMoves list
-        for x, y, w in legalMoves:
-            validMoves[(x * self.n * self.tileTypes) + (y * self.tileTypes) + w] = 1
-        # Convert to np array for performance
-        return np.array(validMoves)
+        # Board is only read so no copy is needed
+        b = self.getBoard(board)
+        # Write the legal (valid) moves straight into the flattened action array
+        # (last action index is set if no other moves are valid, which in Kindo
+        # should only occur when the game is over)
+        return b.get_legal_moves_mask(player, np.zeros(self.getActionSize(), dtype=int))
 
     def getGameEnded(self, board, player):
         """
         Input:
-            board: current board
-            player: current player (1 or -1)
+            board: current board, or a canonical board (see getCanonicalForm)
+            player: current player (1 or -1), 1 for a canonical board
 
         Returns:
             r: 0 if game has not ended. 1 if player won, -1 if player lost,
                small non-zero value for draw.
                
         """
-        # Create a copy of the current board
-        b = Board(self.n)
-        b.tiles = np.copy(board)
+        # Board is only read so no copy is needed
+        b = self.getBoard(board)
         # Check if any of the terminal conditions have been reached
         kingCaptured = b.king_captured(player)
         walledIn = b.walled_in(player)
@@ -195,15 +215,21 @@ class KindoGame(Game):
                             of white. When the player is white, we can return
                             board as is. When the player is black, we can invert
                             the colors and return the board.
+                            canonicalBoard is read-only: for player 1 it is
+                            a view of board (no copy), for player -1 the owner
+                            of all tiles and the ids of both players are
+                            negated in a copy (see Board.swap_players), so
+                            player 1 of canonicalBoard is player -1 of board.
+                            Callers which modify it must copy it first.
         """
-        # Create a copy of the current board
-        b = Board(self.n)
-        b.tiles = np.copy(board)
-        # If player 2 swap owner of all tiles on board
         if player == -1:
-            b.swap_all_tile_owners()
-        # return canonical board
-        return np.array(b.tiles)
+            # Swap owner of all tiles and the player ids on a copy of the board
+            canonicalBoard = np.array(board)
+            Board.swap_players(canonicalBoard)
+        else:
+            canonicalBoard = board.view()
+        canonicalBoard.flags.writeable = False
+        return canonicalBoard
 
     def getSymmetries(self, board, pi):
         """
@@ -238,17 +264,85 @@ class KindoGame(Game):
             board: current board
 
         Returns:
-            boardString: a quick conversion of board to a string format.
-                         Required by MCTS for hashing.
+            boardString: a quick conversion of board to a string format (the
+                         bytes of board as int8, lossless for n <= 11 as in
+                         packBoard). Required by MCTS for hashing.
+        """
+        return board.astype(np.int8).tobytes()
+
+    def getSymmetricForm(self, board):
+        """
+        Input:
+            board: current board in its canonical form
+
+        Returns:
+            symBoard: board or its mirror image (see Board.mirror), whichever
+                      has the smaller stringRepresentation, so a board and its
+                      mirror image have the same symBoard
+            key: stringRepresentation(symBoard), shared by board and its mirror
+                 image
+            mirrored: True if symBoard is the mirror image of board, policy
+                      vectors of symBoard are then mapped back to board with
+                      mirrorPolicy
+        """
+        mirroredBoard = self.mirrorBoard(board)
+        key = self.stringRepresentation(board)
+        mirroredKey = self.stringRepresentation(mirroredBoard)
+        if mirroredKey < key:
+            return (mirroredBoard, mirroredKey, True)
+        return (board, key, False)
+
+    def mirrorBoard(self, board):
+        """
+        Input:
+            board: current board
+
+        Returns:
+            mirroredBoard: the (read-only) mirror image of board, an equivalent
+                           position (see Board.mirror)
+        """
+        mirroredBoard = Board.mirror(board)
+        mirroredBoard.flags.writeable = False
+        return mirroredBoard
+
+    def mirrorPolicy(self, pi):
+        """
+        Input:
+            pi: policy vector (or visit counts) of size self.getActionSize()
+
+        Returns:
+            mirroredPi: pi for the mirror image of the board (see mirrorBoard),
+                        a numpy array. Mirroring twice gives pi back.
+        """
+        return np.asarray(pi)[Board.mirror_actions(self.n)]
+
+    def packBoard(self, board):
+        """
+        Input:
+            board: current board (or a stack of boards)
+
+        Returns:
+            packedBoard: board in the compact int8 format (n * n + 8 bytes, see
+                         Board.pack) for storing in replay buffers, caches or
+                         sending to other processes
+        """
+        return Board.pack(board)
+
+    def unpackBoard(self, packedBoard):
+        """
+        Input:
+            packedBoard: board returned by packBoard
+
+        Returns:
+            board: the original n x n x 9 board
         """
-        board.tostring()
+        return Board.unpack(packedBoard)
 
     def getScore(self, board, player):
         '''
         Simple evaluation function used by GreedyKindoPlayer to choose action
         '''
-        b = Board(self.n)
-        b.tiles = np.copy(board)
+        b = self.getBoard(board)
         return b.get_tilesOwned_dif(player)
 
     @staticmethod
@@ -279,8 +373,7 @@ class KindoGame(Game):
         #   |       |       |       |       |       |
         #   ----------------------------------------- 
         n = board.shape[0]
-        b = Board(n)
-        b.tiles = np.copy(board)
+        b = Board.wrap(board)
         # Print number of moves for each player
         # Player 1 Moves: current turn | next turn
         # Player 2 Moves: current turn | next turn
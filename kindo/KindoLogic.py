@@ -1,4 +1,5 @@
 import numpy as np
+from .KindoBitLogic import BitBoard
 
 '''
 Author: Daniel Scalettar (https://github.com/scalettar/)
@@ -14,94 +15,180 @@ class Board():
         board[x, y], x indexes columns, y indexes rows, (0, 0) is top left
         values: 1 = player 1, -1 = player 2, 0 = neutral
     '''
+    # Define constant parameters
+    TILE_PROPERTIES = 9
+    MOVES_MAX = 4 # maximum current or next turn moves a player can have
+    MOVES_NEXT_BASE = 2 # base moves for start of turn without bonus moves
+    # Define constant initial parameters
+    INIT_P1_MOVES = 1 # initial number of moves for p1
+    INIT_P2_MOVES = 0 # initial number of moves for p2
+    INIT_P1_MOVES_NEXT = 2 # initial number of moves for p1's next turn
+    INIT_P2_MOVES_NEXT = 2 # initial number of moves for p2's next turn
+    # The following are the tile properties ordered by index
+    # [0] owner: player id of player who owns tile (0: none, 1: p1, -1: p2)
+    OWNER = 0
+    # [1] wall: 0 if no wall on this tile, else 1 if N, 2 if E, 3 if S, 4 if W
+    WALL_DIRECTION = 1
+    # [2] hasDot: true if owner captured tile on previous turn until owner's next turn
+    HAS_DOT = 2
+    # [3] isKing: true if tile is a king tile
+    IS_KING = 3
+    # [4] isUnwallable: true if wall cannot be placed on this tile
+    IS_UNWALLABLE = 4
+    # [5] playerID: number to identify the player
+    PLAYER_ID = 5
+    # [6] movesCurrent: number of moves player has remaining in current turn
+    MOVES_CURRENT = 6
+    # [7] movesNext: number of moves player will have at start of their next turn
+    MOVES_NEXT = 7
+    # [8] numTilesOwned: number of tiles owned by the player
+    NUM_TILES_OWNED = 8
+    # Indexes 5-8 are player properties
+    # Indexes into a player record (properties 5-8 of a King tile)
+    P_ID = 0
+    P_MOVES_CURRENT = 1
+    P_MOVES_NEXT = 2
+    P_NUM_TILES_OWNED = 3
+    # Player 1's King's n x n location stores Player 1's info for update and retrieval
+    # Player 2's King's n x n location stores Player 2's info for update and retrieval
+    # Initial layout for each board size n (see _get_layout)
+    _LAYOUTS = {}
+    # Wall directions 1: N, 2: E, 3: S, 4: W
+    _WALL_DIRECTIONS = np.arange(1, 5)
+    # Neighbour tables for each board size n (see _get_neighbours)
+    _NEIGHBOURS = {}
+    # Tile properties and values of the owner and wall masks used by walled_in
+    # (p1 owner, p2 owner, wall N, wall E, wall S, wall W)
+    _WALLED_IN_INDEX = [0, 0, 1, 1, 1, 1]
+    _WALLED_IN_VALUE = [1, -1, 1, 2, 3, 4]
+    # Walled in gates for each board size n (see _get_walled_in_gates)
+    _WALLED_IN_GATES = {}
+    # Zobrist keys for each board size n (see _get_zobrist_keys), generated from
+    # a fixed seed so hashes are the same in every process
+    _ZOBRIST_KEYS = {}
+    _ZOBRIST_SEED = 20200301
+    _ZOBRIST_MASK = (1 << 64) - 1
+    # Packed board format (see pack): one byte per tile followed by a header of
+    # the 4 player properties of player 1's then player 2's King tile
+    # Tile byte bits: 0-1 owner (1: p1, 3: p2), 2-4 wall, 5 dot, 6 King, 7 unwallable
+    _PACKED_SHIFTS = np.array([0, 2, 5, 6, 7])
+    _PACKED_HEADER = 8
+    # Mirror image of the board (see mirror): mirrored wall directions (N <-> E,
+    # S <-> W) and mirrored actions for each board size n (see mirror_actions)
+    _MIRROR_WALLS = np.array([0, 2, 1, 4, 3])
+    _MIRROR_ACTIONS = {}
+
     def __init__(self, n):
         """
         Initializes starting board state
         """
-        # Define constant parameters
-        self.TILE_PROPERTIES = 9
-        self.MOVES_MAX = 4 # maximum current or next turn moves a player can have
-        self.MOVES_NEXT_BASE = 2 # base moves for start of turn without bonus moves
-        # Define constant initial parameters
-        self.INIT_P1_MOVES = 1 # initial number of moves for p1
-        self.INIT_P2_MOVES = 0 # initial number of moves for p2
-        self.INIT_P1_MOVES_NEXT = 2 # initial number of moves for p1's next turn
-        self.INIT_P2_MOVES_NEXT = 2 # initial number of moves for p2's next turn
         # Set board dimensions (n x n)
         self.n = n
-        # Create the board (n x n x TILE_PROPERTIES)
-        # The following are the tile properties ordered by index
-        # [0] owner: player id of player who owns tile (0: none, 1: p1, -1: p2)
-        self.OWNER = 0
-        # [1] wall: 0 if no wall on this tile, else 1 if N, 2 if E, 3 if S, 4 if W
-        self.WALL_DIRECTION = 1
-        # [2] hasDot: true if owner captured tile on previous turn until owner's next turn
-        self.HAS_DOT = 2
-        # [3] isKing: true if tile is a king tile
-        self.IS_KING = 3
-        # [4] isUnwallable: true if wall cannot be placed on this tile
-        self.IS_UNWALLABLE = 4
-        # [5] playerID: number to identify the player
-        self.PLAYER_ID = 5
-        # [6] movesCurrent: number of moves player has remaining in current turn
-        self.MOVES_CURRENT = 6
-        # [7] movesNext: number of moves player will have at start of their next turn
-        self.MOVES_NEXT = 7
-        # [8] numTilesOwned: number of tiles owned by the player
-        self.NUM_TILES_OWNED = 8
-        # Indexes 5-8 are player properties
-        # Player 1's King's n x n location stores Player 1's info for update and retrieval
-        # Player 2's King's n x n location stores Player 2's info for update and retrieval
-        self.tiles = np.zeros((self.n, self.n, 9), dtype=int)
-        # Set King tiles
-        self.tiles[self.n-1, 0, self.OWNER] = 1
-        self.tiles[self.n-1, 0, self.IS_KING] = True
-        self.tiles[self.n-1, 0, self.IS_UNWALLABLE] = True
-        self.tiles[0, self.n-1, self.OWNER] = -1
-        self.tiles[0, self.n-1, self.IS_KING] = True
-        self.tiles[0, self.n-1, self.IS_UNWALLABLE] = True
-        # Set unwallable tiles (cannot place walls on these tiles)
-        for i in range(self.n):
-            self.tiles[i, i, self.IS_UNWALLABLE] = True
-        # Set Player values
-        self.tiles[self.n-1, 0, self.PLAYER_ID] = 1
-        self.tiles[self.n-1, 0, self.MOVES_CURRENT] = self.INIT_P1_MOVES
-        self.tiles[self.n-1, 0, self.MOVES_NEXT] = self.INIT_P1_MOVES_NEXT
-        self.tiles[self.n-1, 0, self.NUM_TILES_OWNED] = 1
-        self.tiles[0, self.n-1, self.PLAYER_ID] = -1
-        self.tiles[0, self.n-1, self.MOVES_CURRENT] = self.INIT_P2_MOVES
-        self.tiles[0, self.n-1, self.MOVES_NEXT] = self.INIT_P2_MOVES_NEXT
-        self.tiles[0, self.n-1, self.NUM_TILES_OWNED] = 1
+        # Create the board (n x n x TILE_PROPERTIES) from the initial layout
+        self._attach(np.array(self._get_layout(n)[0]))
+
+    @classmethod
+    def wrap(cls, tiles):
+        '''
+        Returns a Board for an existing n x n x 9 array without copying it or
+        writing the initial layout (the Board shares memory with tiles)
+        '''
+        b = cls.__new__(cls)
+        b.n = tiles.shape[0]
+        b._attach(tiles)
+        return b
+
+    def _attach(self, tiles):
+        '''
+        Sets the board to the n x n x 9 array tiles with empty caches
+        '''
+        self.tiles = tiles
+        # Undo stack for make_move / unmake_move
+        # Each entry is a list of (index, values) pairs to write back into tiles
+        # and the connected tiles and Zobrist caches from before the move
+        self.history = []
+        # Bitmasks (bit x * n + y) of the tiles connected to each player's King
+        # tile, [0] for player 1 and [1] for player -1, None if not computed yet
+        self.connected = [None, None]
+        # Zobrist hashes of the board as is and with tile owners swapped
+        # (canonical form for player -1), None if not computed yet
+        self.zobrist = None
+        # The caches are kept up to date by execute_move and belong to cachedTiles
+        self.cachedTiles = None
+
+    @classmethod
+    def _get_layout(cls, n):
+        '''
+        Returns the constant layout of an n x n board, computing it on first use:
+        (initial tiles, wallable tiles mask, King coordinates)
+        King coordinates are ([x of p1 King, x of p2 King], [y of p1 King, y of p2 King])
+        so tiles[kings] are the player properties of both players
+        '''
+        if n not in cls._LAYOUTS:
+            tiles = np.zeros((n, n, cls.TILE_PROPERTIES), dtype=int)
+            # Set King tiles
+            tiles[n-1, 0, cls.OWNER] = 1
+            tiles[n-1, 0, cls.IS_KING] = True
+            tiles[n-1, 0, cls.IS_UNWALLABLE] = True
+            tiles[0, n-1, cls.OWNER] = -1
+            tiles[0, n-1, cls.IS_KING] = True
+            tiles[0, n-1, cls.IS_UNWALLABLE] = True
+            # Set unwallable tiles (cannot place walls on these tiles)
+            for i in range(n):
+                tiles[i, i, cls.IS_UNWALLABLE] = True
+            # Set Player values
+            tiles[n-1, 0, cls.PLAYER_ID] = 1
+            tiles[n-1, 0, cls.MOVES_CURRENT] = cls.INIT_P1_MOVES
+            tiles[n-1, 0, cls.MOVES_NEXT] = cls.INIT_P1_MOVES_NEXT
+            tiles[n-1, 0, cls.NUM_TILES_OWNED] = 1
+            tiles[0, n-1, cls.PLAYER_ID] = -1
+            tiles[0, n-1, cls.MOVES_CURRENT] = cls.INIT_P2_MOVES
+            tiles[0, n-1, cls.MOVES_NEXT] = cls.INIT_P2_MOVES_NEXT
+            tiles[0, n-1, cls.NUM_TILES_OWNED] = 1
+            tiles.flags.writeable = False
+            wallable = tiles[:, :, cls.IS_UNWALLABLE] == 0
+            wallable.flags.writeable = False
+            cls._LAYOUTS[n] = (tiles, wallable, ([n-1, 0], [0, n-1]))
+        return cls._LAYOUTS[n]
 
     def get_legal_moves(self, player):
         '''
         Returns all the legal moves for the player in the given board state
         Actions 
         '''
-        # Create set to store legal moves
-        legalMoves = set()
-        # Check each tile
-        for x in range(self.n):
-            for y in range(self.n):
-                # Check tile owner
-                if self.tiles[x, y, self.OWNER] == player and not (self.tiles[x, y, self.IS_UNWALLABLE]):
-                    # Tile already owned by current player
-                    # Valid moves: placing any wall not already on the tile in same direction
-                    newMoves = []
-                    for i in range(1, 5):
-                        if i != self.tiles[x, y, self.WALL_DIRECTION]:
-                            # No wall already facing that direction on tile x, y
-                            newMoves.append((x, y, i))
-                    legalMoves.update(newMoves)
-                elif self.tiles[x, y, self.OWNER] != player:
-                    # Tile not owned by current player
-                    # Valid moves: capture tile if an adjacent tile owned by player
-                    # and is not being blocked by a wall on this tile
-                    newMoves = []
-                    if self._check_valid_adjacent(x, y, player):
-                        newMoves.append((x, y, 0))
-                    legalMoves.update(newMoves)
-        return list(legalMoves)
+        legalMoves = self.get_legal_moves_mask(player)[:-1].reshape((self.n, self.n, 5))
+        return [tuple(move) for move in np.argwhere(legalMoves).tolist()]
+
+    def get_legal_moves_mask(self, player, out=None):
+        '''
+        Returns the legal moves for the player as a flattened action mask with the
+        same layout as KindoGame.getActionSize: index (x * n + y) * 5 + w is 1 if
+        move (x, y, w) is legal, the final index is 1 only if no move is legal
+        If out is given the mask is written into it (length n * n * 5 + 1)
+        '''
+        if out is None:
+            out = np.zeros(self.n * self.n * 5 + 1, dtype=int)
+        legalMoves = out[:-1].reshape((self.n, self.n, 5))
+        owned = self.tiles[:, :, self.OWNER] == player
+        wall = self.tiles[:, :, self.WALL_DIRECTION]
+        # Capturing: tile not owned by player with an adjacent tile owned by player
+        # which is not blocked by a wall on the tile (see _check_valid_adjacent)
+        capture = np.zeros((self.n, self.n), dtype=bool)
+        # Owned tile above (x - 1) and no wall facing up
+        capture[1:, :] |= owned[:-1, :] & (wall[1:, :] != 1)
+        # Owned tile to right (y + 1) and no wall facing right
+        capture[:, :-1] |= owned[:, 1:] & (wall[:, :-1] != 2)
+        # Owned tile below (x + 1) and no wall facing down
+        capture[:-1, :] |= owned[1:, :] & (wall[:-1, :] != 3)
+        # Owned tile to left (y - 1) and no wall facing left
+        capture[:, 1:] |= owned[:, :-1] & (wall[:, 1:] != 4)
+        legalMoves[:, :, 0] = capture & ~owned
+        # Placing walls: owned, wallable tiles, any wall not already on the tile
+        wallable = owned & self._get_layout(self.n)[1]
+        legalMoves[:, :, 1:] = wallable[:, :, np.newaxis] & (wall[:, :, np.newaxis] != self._WALL_DIRECTIONS)
+        # No legal moves found (in Kindo this should only occur when the game is over)
+        out[-1] = not legalMoves.any()
+        return out
 
     def execute_move(self, move, player):
         '''
@@ -110,68 +197,125 @@ class Board():
         y: y-coordinate of targeted tile
         w: type of tile to place (wallDirection of Tile)
         '''
+        return self._execute_move(move, player, None)
+
+    def make_move(self, move, player):
+        '''
+        Executes given move in place (same as execute_move) and records the tiles
+        and player slots it changes on the undo stack so unmake_move can revert it
+        Returns the player who makes the next move
+        '''
+        changes = []
+        connected = list(self._get_connected_cache())
+        zobrist = None if self.zobrist is None else list(self.zobrist)
+        nextPlayer = self._execute_move(move, player, changes)
+        self.history.append((changes, connected, zobrist))
+        return nextPlayer
+
+    def unmake_move(self):
+        '''
+        Reverts the last move executed with make_move
+        '''
+        changes, connected, zobrist = self.history.pop()
+        # Restore in reverse order so the oldest value of each slot is written last
+        for index, values in reversed(changes):
+            self.tiles[index] = values
+        self.connected = connected
+        self.zobrist = zobrist
+
+    def _execute_move(self, move, player, changes):
+        '''
+        Executes given move (see execute_move)
+        If changes is a list, the previous values of every changed tile and
+        player slot are appended to it as (index, values) pairs
+        '''
+        # Player records (playerID, movesCurrent, movesNext, numTilesOwned) of the
+        # player stored at Player 1's King tile and at Player 2's King tile
+        # Updated as Python ints and written back to the King tiles once at the end
+        p1Player = self.tiles[self.n-1, 0, self.PLAYER_ID:]
+        p2Player = self.tiles[0, self.n-1, self.PLAYER_ID:]
+        players = [p1Player.tolist(), p2Player.tolist()]
         # Get appropriate player info given player
-        currentPlayer = self._get_this_player(player)
-        opposingPlayer = self._get_other_player(player)
+        c = 0 if players[0][self.P_ID] == player else 1
+        currentPlayer = players[c]
+        opposingPlayer = players[1 - c]
         # Extract move parameters x, y, and w
         (x, y, w) = move
+        if changes is not None:
+            # Player slots of both players and the targeted tile
+            changes.append(((self.n-1, 0, slice(self.PLAYER_ID, None)), list(players[0])))
+            changes.append(((0, self.n-1, slice(self.PLAYER_ID, None)), list(players[1])))
+            changes.append(((x, y, slice(None, self.PLAYER_ID)), np.copy(self.tiles[x, y, :self.PLAYER_ID])))
+        # Previous values of the targeted tile and player counters for the Zobrist hash
+        zobrist = self._get_zobrist_cache()
+        if zobrist is not None:
+            oldTile = self.tiles[x, y, :self.IS_KING].tolist()
+            oldCounters = players[0][self.P_MOVES_CURRENT:] + players[1][self.P_MOVES_CURRENT:]
         # Execute move depending on type (capturing or placing wall)
         if w != 0: # Placing Wall Action
             # Update direction of wall on tile
             self.tiles[x, y, self.WALL_DIRECTION] = w
             # Subtract a move from the current player
-            currentPlayer[self.MOVES_CURRENT] -= 1
+            currentPlayer[self.P_MOVES_CURRENT] -= 1
+            if zobrist is not None:
+                self._update_zobrist_tile(x, y, oldTile)
         else: # Capturing Action
             if self.tiles[x, y, self.OWNER] == 0: # Tile at x, y is neutral
                 # Current player captures tile
-                self.tiles[x, y, self.OWNER] = currentPlayer[self.PLAYER_ID]
+                self.tiles[x, y, self.OWNER] = currentPlayer[self.P_ID]
                 self.tiles[x, y, self.HAS_DOT] = True
-                currentPlayer[self.MOVES_CURRENT] -= 1
-                currentPlayer[self.NUM_TILES_OWNED] += 1
+                currentPlayer[self.P_MOVES_CURRENT] -= 1
+                currentPlayer[self.P_NUM_TILES_OWNED] += 1
+                self._connect_captured_tile(x, y, currentPlayer[self.P_ID])
+                if zobrist is not None:
+                    self._update_zobrist_tile(x, y, oldTile)
             else: # Tile at x, y is owned by opposing player
                 # Check if tile has a dot and award opponent a bonus move if true
                 if self.tiles[x, y, self.HAS_DOT] == True \
-                    and opposingPlayer[self.MOVES_NEXT] < self.MOVES_MAX:
-                    opposingPlayer[self.MOVES_NEXT] += 1
+                    and opposingPlayer[self.P_MOVES_NEXT] < self.MOVES_MAX:
+                    opposingPlayer[self.P_MOVES_NEXT] += 1
                 # Current player captures tile
-                self.tiles[x, y, self.OWNER] = currentPlayer[self.PLAYER_ID]
+                self.tiles[x, y, self.OWNER] = currentPlayer[self.P_ID]
                 self.tiles[x, y, self.HAS_DOT] = True
                 self.tiles[x, y, self.WALL_DIRECTION] = 0
-                currentPlayer[self.MOVES_CURRENT] -= 1
-                currentPlayer[self.NUM_TILES_OWNED] += 1
-                opposingPlayer[self.NUM_TILES_OWNED] -= 1
+                currentPlayer[self.P_MOVES_CURRENT] -= 1
+                currentPlayer[self.P_NUM_TILES_OWNED] += 1
+                opposingPlayer[self.P_NUM_TILES_OWNED] -= 1
+                self._connect_captured_tile(x, y, currentPlayer[self.P_ID])
+                if zobrist is not None:
+                    self._update_zobrist_tile(x, y, oldTile)
                 # Check if any other tiles were detached from opponent's King tile
-                connectedOpponent = self._get_connected_tiles(opposingPlayer[self.PLAYER_ID])
-                connectedTilesNum = len(connectedOpponent)
-                if connectedTilesNum < opposingPlayer[self.NUM_TILES_OWNED]:
+                connectedOpponent = self._disconnect_captured_tile(x, y, opposingPlayer[self.P_ID])
+                # None: no tile was disconnected, skip the mass capture
+                connectedTilesNum = None if connectedOpponent is None else bin(connectedOpponent).count('1')
+                if connectedTilesNum is not None and connectedTilesNum < opposingPlayer[self.P_NUM_TILES_OWNED]:
                     # Mass capture detached tiles (swap from opponent to current player)
-                    self._mass_capture(currentPlayer, opposingPlayer, connectedOpponent)
+                    self._mass_capture(currentPlayer, opposingPlayer, connectedOpponent, changes)
                     # Award bonus move to current player for detaching opponent tiles
-                    if currentPlayer[self.MOVES_NEXT] < self.MOVES_MAX:
-                        currentPlayer[self.MOVES_NEXT] += 1
+                    if currentPlayer[self.P_MOVES_NEXT] < self.MOVES_MAX:
+                        currentPlayer[self.P_MOVES_NEXT] += 1
                     # Update number of tiles owned for both players
-                    numMassCaptured = opposingPlayer[self.NUM_TILES_OWNED] - connectedTilesNum
-                    currentPlayer[self.NUM_TILES_OWNED] += numMassCaptured
-                    opposingPlayer[self.NUM_TILES_OWNED] -= numMassCaptured 
+                    numMassCaptured = opposingPlayer[self.P_NUM_TILES_OWNED] - connectedTilesNum
+                    currentPlayer[self.P_NUM_TILES_OWNED] += numMassCaptured
+                    opposingPlayer[self.P_NUM_TILES_OWNED] -= numMassCaptured
         # Determine which player is making the next move
-        if currentPlayer[self.MOVES_CURRENT] < 1:
+        if currentPlayer[self.P_MOVES_CURRENT] < 1:
             temp = currentPlayer
             currentPlayer = opposingPlayer
             opposingPlayer = temp
             # New current player's moves are updated to be equal to that player's next moves
-            currentPlayer[self.MOVES_CURRENT] = currentPlayer[self.MOVES_NEXT]
+            currentPlayer[self.P_MOVES_CURRENT] = currentPlayer[self.P_MOVES_NEXT]
             # New current player's next moves are set to default base number of next moves
-            currentPlayer[self.MOVES_NEXT] = self.MOVES_NEXT_BASE
+            currentPlayer[self.P_MOVES_NEXT] = self.MOVES_NEXT_BASE
             # Remove dots from new current player's tiles
-            self._new_turn_clear_dots(currentPlayer)
-        # Update player
-        if currentPlayer[self.PLAYER_ID] == 1:
-            self.tiles[self.n-1, 0, :] = currentPlayer
-            self.tiles[0, self.n-1, :] = opposingPlayer
-        else:
-            self.tiles[self.n-1, 0, :] = opposingPlayer
-            self.tiles[0, self.n-1, :] = currentPlayer
-        return currentPlayer[self.PLAYER_ID]
+            self._new_turn_clear_dots(currentPlayer, changes)
+        # Update players
+        p1Player[:] = players[0]
+        p2Player[:] = players[1]
+        if zobrist is not None:
+            self._update_zobrist_players(oldCounters,
+                players[0][self.P_MOVES_CURRENT:] + players[1][self.P_MOVES_CURRENT:])
+        return currentPlayer[self.P_ID]
 
     def _check_valid_adjacent(self, x, y, player):
         '''
@@ -200,8 +344,8 @@ class Board():
 
     def _get_connected_tiles(self, player):
         '''
-        Finds and returns a list of all tiles connected to player's King tile
-        The list uses a flattened index converted from (x, y) coordinate pairs
+        Finds and returns a bitmask of all tiles connected to player's King tile
+        The bitmask uses a flattened index converted from (x, y) coordinate pairs
         e.g. for n = 5 (5 x 5 board):
                 0	1	2	3	4
         	-----------------------
@@ -210,119 +354,425 @@ class Board():
         2	|	10	11	12	13	14
         3	|	15	16	17	18	19
         4	|	20	21	22	23	24
+        The result is cached and kept up to date incrementally by execute_move,
+        which only saves work while the same Board keeps being moved (make_move /
+        unmake_move searches such as perft): KindoGame wraps a new Board with an
+        empty cache in every call
+        '''
+        connected = self._get_connected_cache()
+        i = 0 if player == 1 else 1
+        if connected[i] is None:
+            # Flood fill from the King tile through tiles owned by player
+            owned = np.packbits(self.tiles[:, :, self.OWNER].ravel() == player, bitorder='little')
+            connected[i] = BitBoard.fill(self.n, 1 << self._get_king_index(player),
+                int.from_bytes(owned.tobytes(), 'little'))
+        return connected[i]
+
+    def _get_connected_cache(self):
+        '''
+        Returns the connected tiles cache, clearing it if tiles was replaced
+        '''
+        self._check_cached_tiles()
+        return self.connected
+
+    def _check_cached_tiles(self):
+        '''
+        Clears the connected tiles and Zobrist caches if tiles was replaced
+        '''
+        if self.cachedTiles is not self.tiles:
+            self.connected = [None, None]
+            self.zobrist = None
+            self.cachedTiles = self.tiles
+
+    def _get_king_index(self, player):
+        '''
+        Returns the flattened index of player's King tile
         '''
-        # List of connected tiles
-        connected = []
-        # Stack to traverse through tiles connected to player's King tile
-        stack = []
-        # Push the corresponding player's King tile onto the stack
         if player == self.tiles[self.n-1, 0, self.PLAYER_ID]:
-            stack.append(self.n * (self.n - 1))
-        else:
-            stack.append(self.n - 1)
-        # Find connected tiles using stack
-        while len(stack):
-            # Explore tile corresponding to first flattened index in stack
-            currentIndex = stack.pop()
-            # Get x and y from flattened index
-            x = currentIndex // self.n
-            y = currentIndex % self.n
-            # If tile is not already in connected array, check if connected
-            if not currentIndex in connected:
-                # Check if tile belongs to player
-                if self.tiles[x, y, self.OWNER] == player:
-                    # Tile belongs to player so add to connected
-                    connected.append(currentIndex)
-                    # Check if adjacent tiles are also connected
-                    if currentIndex > (self.n - 1): # Check tile above
-                        stack.append(currentIndex - self.n)
-                    if (currentIndex + 1) % self.n != 0: # Check tile to right
-                        stack.append(currentIndex + 1)
-                    if currentIndex < (self.n * (self.n - 1)): # Check tile below
-                        stack.append(currentIndex + self.n)
-                    if currentIndex % self.n != 0: # Check tile to left
-                        stack.append(currentIndex - 1)
-        return connected
-
-    def _mass_capture(self, currentPlayer, opposingPlayer, connectedOpponent):
+            return self.n * (self.n - 1)
+        return self.n - 1
+
+    def _connect_captured_tile(self, x, y, player):
+        '''
+        Updates the tiles connected to player's King tile after player captured x, y
+        '''
+        connected = self._get_connected_cache()
+        i = 0 if player == 1 else 1
+        if connected[i] is None:
+            return
+        index = x * self.n + y
+        if index == self._get_king_index(player):
+            # Recaptured King tile, recompute when needed
+            connected[i] = None
+            return
+        # Player owned neighbours of the captured tile
+        neighbours = [j for j, corner in self._get_neighbours(self.n)[index] \
+            if j is not None and self.tiles[j // self.n, j % self.n, self.OWNER] == player]
+        if any(connected[i] >> j & 1 for j in neighbours):
+            connected[i] |= 1 << index
+            if not all(connected[i] >> j & 1 for j in neighbours):
+                # Captured tile joins the King's tiles with detached tiles
+                connected[i] = None
+
+    def _disconnect_captured_tile(self, x, y, player):
+        '''
+        Updates and returns the tiles connected to player's King tile after
+        player's tile x, y was captured, or None if no tile was disconnected
+        Every tile owned by player is connected (detached tiles are mass captured
+        right away), so x, y can only be a cut tile if its neighbours owned by
+        player are not linked through a shared corner tile: only then the
+        connected tiles are rebuilt with a flood fill
+        '''
+        connected = self._get_connected_cache()
+        i = 0 if player == 1 else 1
+        index = x * self.n + y
+        if index == self._get_king_index(player):
+            connected[i] = 0
+            return 0
+        # Neighbours in clockwise order N, E, S, W with the corner tile between
+        # each neighbour and the next one
+        owner = self.tiles.reshape((self.n * self.n, -1))[:, self.OWNER]
+        ring = self._get_neighbours(self.n)[index]
+        present = [j is not None and owner[j] == player for j, corner in ring]
+        links = 0
+        for d in range(4):
+            corner = ring[d][1]
+            if present[d] and present[(d + 1) % 4] and owner[corner] == player:
+                links += 1
+        # Neighbours form a subgraph of a 4-cycle, so components = nodes - links
+        # (unless it is the full cycle)
+        if sum(present) - links <= 1 or links == 4:
+            if connected[i] is not None:
+                connected[i] &= ~(1 << index)
+            return None
+        connected[i] = None
+        return self._get_connected_tiles(player)
+
+    @classmethod
+    def _get_neighbours(cls, n):
+        '''
+        Returns for each flattened index the 4 (neighbour, corner) pairs in
+        clockwise order N, E, S, W where corner is the tile diagonally between
+        the neighbour and the next one (None if off the board)
+        '''
+        if n not in cls._NEIGHBOURS:
+            def index(x, y):
+                return x * n + y if 0 <= x < n and 0 <= y < n else None
+            cls._NEIGHBOURS[n] = [[
+                (index(x-1, y), index(x-1, y+1)),
+                (index(x, y+1), index(x+1, y+1)),
+                (index(x+1, y), index(x+1, y-1)),
+                (index(x, y-1), index(x-1, y-1))]
+                for x in range(n) for y in range(n)]
+        return cls._NEIGHBOURS[n]
+
+    def _mass_capture(self, currentPlayer, opposingPlayer, connectedOpponent, changes=None):
         '''
         Swaps ownership from opponent to player of all tiles owned by opponent but
-        no longer connected
-        '''
-        # Check each tile on board and see if ownership swap is needed
-        for x in range(self.n):
-            for y in range(self.n):
-                # Check if tile owned by opponent is no longer connected
-                if self.tiles[x, y, self.OWNER] == opposingPlayer[self.PLAYER_ID] \
-                    and not ((x * self.n + y) in connectedOpponent):
-                    # Swap tile owner from opponent to current player
-                    self.tiles[x, y, self.OWNER] = currentPlayer[self.PLAYER_ID]
-                    # Remove any walls and dots from the tile
-                    self.tiles[x, y, self.HAS_DOT] = False
-                    self.tiles[x, y, self.WALL_DIRECTION] = 0
-
-    def _new_turn_clear_dots(self, currentPlayer):
+        no longer connected (connectedOpponent is a bitmask, see _get_connected_tiles)
+        currentPlayer and opposingPlayer are player records (see _execute_move)
+        If changes is a list, the previous values of swapped tiles are appended to it
+        '''
+        # Tiles owned by opponent which are no longer connected
+        swapped = (self.tiles[:, :, self.OWNER] == opposingPlayer[self.P_ID]) \
+            & ~self._get_tiles_mask(connectedOpponent)
+        (xs, ys) = np.nonzero(swapped)
+        oldTiles = self.tiles[xs, ys, :self.PLAYER_ID]
+        if changes is not None:
+            changes.append(((xs, ys, slice(None, self.PLAYER_ID)), oldTiles))
+        # Swap tile owner from opponent to current player
+        self.tiles[xs, ys, self.OWNER] = currentPlayer[self.P_ID]
+        # Remove any walls and dots from the tiles
+        self.tiles[xs, ys, self.HAS_DOT] = False
+        self.tiles[xs, ys, self.WALL_DIRECTION] = 0
+        if self.zobrist is not None:
+            self._update_zobrist_tiles(xs, ys, oldTiles)
+        # Swapped tiles may now connect to the player's King tile, recompute when needed
+        self._get_connected_cache()[0 if currentPlayer[self.P_ID] == 1 else 1] = None
+
+    def _new_turn_clear_dots(self, currentPlayer, changes=None):
         '''
         Clear dots from new current player's tiles
+        currentPlayer is a player record (see _execute_move)
+        If changes is a list, the previous values of cleared dots are appended to it
+        '''
+        dots = self.tiles[:, :, self.HAS_DOT]
+        (xs, ys) = np.nonzero((self.tiles[:, :, self.OWNER] == currentPlayer[self.P_ID]) & (dots != 0))
+        if not xs.size:
+            return
+        if changes is not None:
+            changes.append(((xs, ys, self.HAS_DOT), dots[xs, ys]))
+        if self.zobrist is not None:
+            self._toggle_zobrist_dots(xs, ys)
+        dots[xs, ys] = False
+
+    def _get_tiles_mask(self, mask):
+        '''
+        Returns the bitmask mask (bit x * n + y) as an n x n boolean array
         '''
-        for x in range(self.n):
-            for y in range(self.n):
-                if self.tiles[x, y, self.OWNER] == currentPlayer[self.PLAYER_ID]:
-                    self.tiles[x, y, self.HAS_DOT] = False
-        
+        size = self.n * self.n
+        data = np.frombuffer(mask.to_bytes((size + 7) // 8, 'little'), dtype=np.uint8)
+        return np.unpackbits(data, bitorder='little')[:size].reshape((self.n, self.n)).view(bool)
+
     def king_captured(self, player):
         '''
         Checks if a King tile has been captured
         If yes, returns winning player (1 or -1)
         Else returns 0
         '''
-        # Check if player 1 captured player 2's King tile
-        if self.tiles[0, self.n-1, self.OWNER] == 1:
-            return 1 if player == 1 else -1
-        # Check if player 2 captured player 1's King tile
-        if self.tiles[self.n-1, 0, self.OWNER] == -1:
-            return 1 if player == -1 else -1
+        # Player owning the King tile at (n-1, 0): the playerID of the player
+        # record stored on it (-1 on the canonical form for player -1)
+        p = self.tiles[self.n-1, 0, self.PLAYER_ID]
+        # Check if that player captured the other player's King tile
+        if self.tiles[0, self.n-1, self.OWNER] == p:
+            return 1 if player == p else -1
+        # Check if the other player captured that player's King tile
+        if self.tiles[self.n-1, 0, self.OWNER] == -p:
+            return 1 if player == -p else -1
         # No King tile has been captured
         return 0
 
     def walled_in(self, player):
         '''
-        !!!WARNING!!! This method only works for n=5, needs to be generalized
         Checks if a player has been walled in (impossible to ever capture enemy King)
         If yes, returns winning player (1 or -1)
         Else returns 0
+        Works for any board size (see BitBoard.walled_in_masks)
         '''
-        # Check if player 1 has walled in player 2
-        if self.tiles[0, 2, self.WALL_DIRECTION] == 2 and self.tiles[1, 2, self.WALL_DIRECTION] == 2 \
-            and self.tiles[2, 3, self.WALL_DIRECTION] == 1 and self.tiles[2, 4, self.WALL_DIRECTION] == 1:
-            # Check if player 1 owns all the tiles walling in player 2
-            if self.tiles[0, 2, self.OWNER] == 1 and self.tiles[1, 2, self.OWNER] == 1 \
-            and self.tiles[2, 3, self.OWNER] == 1 and self.tiles[2, 4, self.OWNER] == 1:
-                return 1 if player == 1 else -1
-        if self.tiles[0, 3, self.WALL_DIRECTION] == 2 and self.tiles[1, 4, self.WALL_DIRECTION] == 1:
-            # Check if player 1 owns all the tiles walling in player 2
-            if self.tiles[0, 3, self.OWNER] == 1 and self.tiles[1, 4, self.OWNER] == 1:
-                return 1 if player == 1 else -1
-        # Check if player 2 has walled in player 1
-        if self.tiles[2, 0, self.WALL_DIRECTION] == 3 and self.tiles[2, 1, self.WALL_DIRECTION] == 3 \
-            and self.tiles[3, 2, self.WALL_DIRECTION] == 4 and self.tiles[4, 2, self.WALL_DIRECTION] == 4:
-            # Check if player 2 owns all the tiles walling in player 1
-            if self.tiles[2, 0, self.OWNER] == -1 and self.tiles[2, 1, self.OWNER] == -1 \
-            and self.tiles[3, 2, self.OWNER] == -1 and self.tiles[4, 2, self.OWNER] == -1:
-                return 1 if player == -1 else -1
-        if self.tiles[3, 0, self.WALL_DIRECTION] == 3 and self.tiles[4, 1, self.WALL_DIRECTION] == 4:
-            # Check if player 2 owns all the tiles walling in player 1
-            if self.tiles[3, 0, self.OWNER] == -1 and self.tiles[4, 1, self.OWNER] == -1:
-                return 1 if player == -1 else -1
-        # No player has been walled in
-        return 0
+        flat = self.tiles.reshape(-1)
+        # Gates are given for player 1 owning the King tile at (n-1, 0), so owners
+        # are seen from the player owning it (see king_captured)
+        p = int(self.tiles[self.n-1, 0, self.PLAYER_ID])
+        # Fast pre-check: a wall cut needs a wall in both of its gates
+        # (see BitBoard._walled_in_gates), checked for both players at once
+        ownerIndex, wallIndex, codes, gateStarts = self._get_walled_in_gates(self.n)
+        hits = np.logical_or.reduceat(flat[ownerIndex] * (8 * p) + flat[wallIndex] == codes, gateStarts).tolist()
+        if not (hits[0] and hits[1]) and not (hits[2] and hits[3]):
+            return 0
+        # Owner and wall masks (bit x * n + y), all packed in a single call
+        planes = self.tiles.reshape((self.n * self.n, self.TILE_PROPERTIES))[:, self._WALLED_IN_INDEX] \
+            == self._WALLED_IN_VALUE
+        packed = np.packbits(planes.T, axis=1, bitorder='little')
+        masks = [int.from_bytes(row.tobytes(), 'little') for row in packed]
+        return BitBoard.walled_in_masks(self.n, masks[:2][::p], [0] + masks[2:], player * p)
+
+    @classmethod
+    def _get_walled_in_gates(cls, n):
+        '''
+        Returns the walled in gates of BitBoard._walled_in_gates as indexes into the
+        flattened tiles, computing them on first use:
+        (owner indexes, wall indexes, owner * 8 + wall codes, start of each gate)
+        Gates are ordered player 1's two gates then player 2's two gates
+        '''
+        if n not in cls._WALLED_IN_GATES:
+            gates = BitBoard._walled_in_gates(n)
+            ownerIndex = []
+            wallIndex = []
+            codes = []
+            gateStarts = []
+            for winner in (1, -1):
+                d1, m1, d2, m2, d3, m3, d4, m4 = gates[winner]
+                for gate in (((d1, m1), (d2, m2)), ((d3, m3), (d4, m4))):
+                    gateStarts.append(len(codes))
+                    for w, mask in gate:
+                        for i in range(n * n):
+                            if mask >> i & 1:
+                                ownerIndex.append(i * 9 + 0)
+                                wallIndex.append(i * 9 + 1)
+                                codes.append(winner * 8 + w)
+            cls._WALLED_IN_GATES[n] = (np.array(ownerIndex), np.array(wallIndex),
+                np.array(codes), np.array(gateStarts))
+        return cls._WALLED_IN_GATES[n]
+
+    def get_zobrist_hash(self, player=1):
+        '''
+        Returns the 64-bit Zobrist hash of the board (an int), or of its canonical
+        form for player (tile owners swapped if player is -1, see
+        swap_all_tile_owners) without building the canonical board
+        The hash is computed on first use and then kept up to date by execute_move
+        '''
+        if self._get_zobrist_cache() is None:
+            self.zobrist = list(self.zobrist_hash(self.tiles))
+        return self.zobrist[0 if player == 1 else 1]
+
+    @classmethod
+    def zobrist_hash(cls, tiles):
+        '''
+        Computes the Zobrist hashes of the n x n x 9 board tiles from scratch
+        Returns (hash of tiles, hash of tiles with owners swapped)
+        Owner, wall and dot of every tile and the moves and number of tiles of
+        both players are hashed, the other properties never change
+        '''
+        n = tiles.shape[0]
+        table, tileKeys, counterKeys, rows = cls._get_zobrist_keys(n)
+        flat = tiles.reshape((n * n, -1))
+        owner = flat[:, 0]
+        # Look up the key of each tile property value (swapped owner second)
+        keys = table[rows, np.stack((owner + 1, 1 - owner, flat[:, 1] + 3, flat[:, 2] + 8), axis=1)]
+        common = int(np.bitwise_xor.reduce(keys[:, 2:], axis=None))
+        kings = cls._get_layout(n)[2]
+        for i, value in enumerate(tiles[kings[0], kings[1], cls.MOVES_CURRENT:].ravel().tolist()):
+            common ^= cls._zobrist_counter(counterKeys, i, value)
+        return (int(np.bitwise_xor.reduce(keys[:, 0])) ^ common,
+            int(np.bitwise_xor.reduce(keys[:, 1])) ^ common)
+
+    @classmethod
+    def _get_zobrist_keys(cls, n):
+        '''
+        Returns the Zobrist keys for board size n, generating them on first use:
+        (table of keys for each tile as an array, same table as lists of ints,
+        keys of the 6 player counters, row indexes for looking up the table)
+        Table columns are owner -1, 0, 1, wall 0-4 and dot 0-1 (no key for 0)
+        '''
+        if n not in cls._ZOBRIST_KEYS:
+            rng = np.random.default_rng(cls._ZOBRIST_SEED + n)
+            table = rng.integers(0, 1 << 64, size=(n * n, 10), dtype=np.uint64)
+            table[:, [1, 3, 8]] = 0
+            # Odd so each counter value maps to a different key (see _zobrist_counter)
+            counterKeys = [key | 1 for key in rng.integers(0, 1 << 64, size=6, dtype=np.uint64).tolist()]
+            cls._ZOBRIST_KEYS[n] = (table, table.tolist(), counterKeys, np.arange(n * n)[:, np.newaxis])
+        return cls._ZOBRIST_KEYS[n]
+
+    @classmethod
+    def _zobrist_counter(cls, counterKeys, i, value):
+        '''
+        Returns the key of player counter i (movesCurrent, movesNext, numTilesOwned
+        of player 1 then player 2) having value
+        '''
+        return (counterKeys[i] * (2 * value + 1)) & cls._ZOBRIST_MASK
+
+    def _get_zobrist_cache(self):
+        '''
+        Returns the Zobrist hashes cache (None if not computed yet), clearing it
+        if tiles was replaced
+        '''
+        self._check_cached_tiles()
+        return self.zobrist
+
+    def _update_zobrist_tile(self, x, y, oldTile):
+        '''
+        Updates the Zobrist hashes after the owner, wall or dot of tile x, y
+        changed from oldTile (owner, wall, dot)
+        '''
+        keys = self._get_zobrist_keys(self.n)[1][x * self.n + y]
+        (owner, wall, dot) = oldTile
+        (newOwner, newWall, newDot) = self.tiles[x, y, :self.IS_KING].tolist()
+        common = keys[wall + 3] ^ keys[newWall + 3] ^ keys[dot + 8] ^ keys[newDot + 8]
+        self.zobrist[0] ^= keys[owner + 1] ^ keys[newOwner + 1] ^ common
+        self.zobrist[1] ^= keys[1 - owner] ^ keys[1 - newOwner] ^ common
+
+    def _update_zobrist_tiles(self, xs, ys, oldTiles):
+        '''
+        Updates the Zobrist hashes after the owner, wall or dot of tiles xs, ys
+        changed from oldTiles (rows of owner, wall, dot, ...)
+        '''
+        table = self._get_zobrist_keys(self.n)[0]
+        index = (xs * self.n + ys)[:, np.newaxis]
+        keys = []
+        for tiles in (oldTiles, self.tiles[xs, ys, :self.IS_KING]):
+            # Keys of owner, swapped owner, wall and dot of every tile
+            keys.append(table[index, np.stack((tiles[:, 0] + 1, 1 - tiles[:, 0], tiles[:, 1] + 3, tiles[:, 2] + 8), axis=1)])
+        change = np.bitwise_xor.reduce(keys[0] ^ keys[1], axis=0).tolist()
+        self.zobrist[0] ^= change[0] ^ change[2] ^ change[3]
+        self.zobrist[1] ^= change[1] ^ change[2] ^ change[3]
+
+    def _toggle_zobrist_dots(self, xs, ys):
+        '''
+        Updates the Zobrist hashes for adding or removing the dots on tiles xs, ys
+        '''
+        change = int(np.bitwise_xor.reduce(self._get_zobrist_keys(self.n)[0][xs * self.n + ys, 9]))
+        self.zobrist[0] ^= change
+        self.zobrist[1] ^= change
+
+    def _update_zobrist_players(self, oldCounters, newCounters):
+        '''
+        Updates the Zobrist hashes after the player counters (movesCurrent,
+        movesNext, numTilesOwned of player 1 then player 2) changed from
+        oldCounters to newCounters
+        '''
+        counterKeys = self._get_zobrist_keys(self.n)[2]
+        change = 0
+        for i, (old, new) in enumerate(zip(oldCounters, newCounters)):
+            if old != new:
+                change ^= self._zobrist_counter(counterKeys, i, old) ^ self._zobrist_counter(counterKeys, i, new)
+        self.zobrist[0] ^= change
+        self.zobrist[1] ^= change
+
+    @classmethod
+    def pack(cls, tiles):
+        '''
+        Returns the n x n x 9 board tiles (or any stack of boards with shape
+        (..., n, n, 9)) in the packed int8 format of shape (..., n * n + 8):
+        one byte per tile followed by the 8 player properties
+        Lossless for boards up to n = 11 (numTilesOwned must fit in an int8)
+        '''
+        n = tiles.shape[-2]
+        flat = tiles.reshape(tiles.shape[:-3] + (n * n, tiles.shape[-1]))
+        # Owner -1 is stored as 3 (its two lowest bits)
+        fields = flat[..., :cls._PACKED_SHIFTS.size] & 7
+        fields[..., 0] &= 3
+        packed = np.empty(tiles.shape[:-3] + (n * n + cls._PACKED_HEADER,), dtype=np.int8)
+        packed[..., :n * n] = np.bitwise_or.reduce(fields << cls._PACKED_SHIFTS, axis=-1).astype(np.uint8).view(np.int8)
+        packed[..., n * n:n * n + 4] = tiles[..., n-1, 0, 5:]
+        packed[..., n * n + 4:] = tiles[..., 0, n-1, 5:]
+        return packed
+
+    @classmethod
+    def unpack(cls, packed):
+        '''
+        Returns the n x n x 9 board tiles (or stack of boards) of a packed board
+        (see pack)
+        '''
+        n = int(round((packed.shape[-1] - cls._PACKED_HEADER) ** 0.5))
+        tileBytes = packed[..., :n * n].view(np.uint8).astype(int)
+        tiles = np.zeros(packed.shape[:-1] + (n * n, 9), dtype=int)
+        tiles[..., :cls._PACKED_SHIFTS.size] = tileBytes[..., np.newaxis] >> cls._PACKED_SHIFTS
+        tiles[..., 1:cls._PACKED_SHIFTS.size] &= [7, 1, 1, 1]
+        # Owner 3 back to -1
+        owner = tiles[..., 0] & 3
+        tiles[..., 0] = owner - 4 * (owner >> 1)
+        tiles = tiles.reshape(packed.shape[:-1] + (n, n, 9))
+        tiles[..., n-1, 0, 5:] = packed[..., n * n:n * n + 4]
+        tiles[..., 0, n-1, 5:] = packed[..., n * n + 4:]
+        return tiles
+
+    @classmethod
+    def mirror(cls, tiles):
+        '''
+        Returns the mirror image of the board tiles (or stack of boards) in the
+        diagonal through both Kings: tile (x, y) moves to (n-1-y, n-1-x) and
+        its wall direction is mirrored (N <-> E, S <-> W)
+        Both Kings (and so the player records) stay in place, so the mirror
+        image is an equivalent position with the same player to move: it is
+        the only symmetry of Kindo, rotations and other reflections move the
+        Kings
+        '''
+        mirrored = np.swapaxes(tiles[..., ::-1, ::-1, :], -3, -2).copy()
+        mirrored[..., cls.WALL_DIRECTION] = cls._MIRROR_WALLS[mirrored[..., cls.WALL_DIRECTION]]
+        return mirrored
+
+    @classmethod
+    def mirror_actions(cls, n):
+        '''
+        Returns the (read-only) permutation of the actions of a board of size n
+        under mirror: action a of a board is action mirror_actions(n)[a] of its
+        mirror image (the permutation is its own inverse)
+        '''
+        if n not in cls._MIRROR_ACTIONS:
+            x, y, w = np.indices((n, n, len(cls._MIRROR_WALLS)))
+            actions = (((n-1-y) * n + (n-1-x)) * len(cls._MIRROR_WALLS) + cls._MIRROR_WALLS[w]).ravel()
+            # The last action (no legal moves) is its own mirror image
+            actions = np.append(actions, actions.size)
+            actions.flags.writeable = False
+            cls._MIRROR_ACTIONS[n] = actions
+        return cls._MIRROR_ACTIONS[n]
 
     def get_tilesOwned_dif(self, player):
         '''
         Returns the difference in tiles owned by player compared to the other player
         '''
-        return self._get_this_player(player).numTilesOwned - \
-            self._get_other_player(player).numTilesOwned
+        return self._get_this_player(player)[self.NUM_TILES_OWNED] - \
+            self._get_other_player(player)[self.NUM_TILES_OWNED]
 
     def _get_this_player(self, player):
         '''
@@ -342,17 +792,30 @@ class Board():
         else:
             return self.tiles[self.n-1, 0]
 
+    @classmethod
+    def swap_players(cls, tiles):
+        '''
+        Negates the owner of all tiles and the playerID of both player records
+        in place, for one board (n x n x 9) or a batch of boards (... x n x n x 9)
+        The result is the same game seen from the other player: the rules
+        identify each player by the playerID stored on its King tile (see
+        _get_this_player and king_captured), so moves of player p on the result
+        are the moves of player -p on tiles
+        '''
+        tiles[..., cls.OWNER] *= -1
+        tiles[..., cls.PLAYER_ID] *= -1
+
     def swap_all_tile_owners(self):
         '''
-        Swaps the ownership of all tiles on the board
-        Used to get the canonical form in KindoGame
+        Swaps the ownership of all tiles and the player ids on the board
+        (canonical form for player -1, see swap_players)
         '''
-        for x in range(self.n):
-            for y in range(self.n):
-                if self.tiles[x, y, self.OWNER] == 1:
-                    self.tiles[x, y, self.OWNER] = -1
-                elif self.tiles[x, y, self.OWNER] == -1:
-                    self.tiles[x, y, self.OWNER] = 1
+        self.swap_players(self.tiles)
+        # Connected tiles are stored by owner so they are no longer valid
+        self.connected = [None, None]
+        # Swapping owners swaps the Zobrist hashes
+        if self._get_zobrist_cache() is not None:
+            self.zobrist = self.zobrist[::-1]
 
 # class Tile:
 #     '''
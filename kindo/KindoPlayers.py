@@ -55,15 +55,23 @@ class GreedyKindoPlayer():
         validMoves = self.game.getValidMoves(board, 1)
         # Empty list of candidate actions
         candidates = []
+        # Board object used to try each action in place (copied once, not per action)
+        b = self.game.getBoard(np.copy(board))
         # Iterate over all possible actions (valid and invalid)
         for action in range(self.game.getActionSize()):
             # Check if current action is invalid
             if validMoves[action] == 0:
                 continue
-            # Action is valid, get next board by applying current action to current board
-            nextBoard, _ = self.game.getNextState(board, 1, action)
+            # No valid actions, nothing to try (board stays the same)
+            if action == self.game.getActionSize() - 1:
+                candidates += [(-self.game.getScore(board, 1), action)]
+                continue
+            # Action is valid, apply current action to the board
+            b.make_move(self.game.getMove(action), 1)
             # Evaluate score of next board state from applying current action
-            score = self.game.getScore(nextBoard, 1)
+            score = b.get_tilesOwned_dif(1)
+            # Undo the action before trying the next one
+            b.unmake_move()
             # Store score action pair in list of candidates
             candidates += [(-score, action)]
         # Sort list of candidate actions
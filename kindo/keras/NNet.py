@@ -21,6 +21,7 @@ args = dotdict({
     'batch_size': 64,
     'cuda': False,
     'num_channels': 512,
+    'cache_size': 100000,   # number of board evaluations kept by predict, 0 to disable the cache
 })
 
 class NNetWrapper(NeuralNet):
@@ -28,11 +29,17 @@ class NNetWrapper(NeuralNet):
         self.nnet = knnet(game, args)
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
+        # evaluations of boards keyed by game.stringRepresentation, shared by
+        # every MCTS using this network and cleared when the weights change
+        self.game = game
+        self.cache = EvaluationCache(args.cache_size) if args.cache_size > 0 else None
 
     def train(self, examples):
         """
         examples: list of examples, each example is of form (board, pi, v)
         """
+        if self.cache is not None:
+            self.cache.clear()  # evaluations of the old weights
         input_boards, target_pis, target_vs = list(zip(*examples))
         input_boards = np.asarray(input_boards)
         target_pis = np.asarray(target_pis)
@@ -46,6 +53,13 @@ class NNetWrapper(NeuralNet):
         # timing
         start = time.time()
 
+        # evaluated before
+        if self.cache is not None:
+            key = self.game.stringRepresentation(board)
+            evaluation = self.cache.get(key)
+            if evaluation is not None:
+                return evaluation
+
         # preparing input
         board = board[np.newaxis, :, :]
 
@@ -53,7 +67,43 @@ class NNetWrapper(NeuralNet):
         pi, v = self.nnet.model.predict(board)
 
         #print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
-        return pi[0], v[0]
+        pi, v = pi[0], v[0]
+        if self.cache is not None:
+            pi.flags.writeable = v.flags.writeable = False  # shared by every lookup
+            self.cache.put(key, (pi, v))
+        return pi, v
+
+    def predictBatch(self, boards):
+        """
+        boards: list of np arrays with boards
+        """
+        pis = np.zeros((len(boards), self.action_size), dtype=np.float32)
+        vs = np.zeros(len(boards), dtype=np.float32)
+
+        # boards evaluated before
+        misses = list(range(len(boards)))
+        if self.cache is not None:
+            keys = [self.game.stringRepresentation(board) for board in boards]
+            misses = []
+            for i, key in enumerate(keys):
+                evaluation = self.cache.get(key)
+                if evaluation is None:
+                    misses.append(i)
+                else:
+                    pis[i], vs[i] = evaluation[0], evaluation[1][0]
+        if not misses:
+            return pis, vs
+
+        # run the other boards in one batch
+        pi, v = self.nnet.model.predict(np.array([boards[i] for i in misses]))
+        pis[misses] = pi
+        vs[misses] = v[:, 0]
+        if self.cache is not None:
+            for i in misses:
+                evaluation = (pis[i].copy(), vs[i:i+1].copy())
+                evaluation[0].flags.writeable = evaluation[1].flags.writeable = False
+                self.cache.put(keys[i], evaluation)
+        return pis, vs
 
     def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         filepath = os.path.join(folder, filename)
@@ -70,3 +120,5 @@ class NNetWrapper(NeuralNet):
         if not os.path.exists(filepath):
             raise("No model in path {}".format(filepath))
         self.nnet.model.load_weights(filepath)
+        if self.cache is not None:
+            self.cache.clear()  # evaluations of the old weights
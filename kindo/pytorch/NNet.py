@@ -27,6 +27,7 @@ args = dotdict({
     'batch_size': 64,
     'cuda': torch.cuda.is_available(),
     'num_channels': 512,
+    'cache_size': 100000,   # number of board evaluations kept by predict, 0 to disable the cache
 })
 
 class NNetWrapper(NeuralNet):
@@ -39,6 +40,10 @@ class NNetWrapper(NeuralNet):
         self.nnet = knnet(game, args)
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
+        # evaluations of boards keyed by game.stringRepresentation, shared by
+        # every MCTS using this network and cleared when the weights change
+        self.game = game
+        self.cache = EvaluationCache(args.cache_size) if args.cache_size > 0 else None
 
         if args.cuda:
             self.nnet.cuda()
@@ -55,6 +60,8 @@ class NNetWrapper(NeuralNet):
                       board in its canonical form.
         """
         optimizer = optim.Adam(self.nnet.parameters())
+        if self.cache is not None:
+            self.cache.clear()  # evaluations of the old weights
 
         for epoch in range(args.epochs):
             print('EPOCH ::: ' + str(epoch+1))
@@ -130,6 +137,13 @@ class NNetWrapper(NeuralNet):
         # timing
         start = time.time()
 
+        # evaluated before
+        if self.cache is not None:
+            key = self.game.stringRepresentation(board)
+            evaluation = self.cache.get(key)
+            if evaluation is not None:
+                return evaluation
+
         # preparing input
         board = torch.FloatTensor(board.astype(np.float64))
         if args.cuda: board = board.contiguous().cuda()
@@ -139,7 +153,55 @@ class NNetWrapper(NeuralNet):
             pi, v = self.nnet(board)
 
         #print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
-        return torch.exp(pi).data.cpu().numpy()[0], v.data.cpu().numpy()[0]
+        pi, v = torch.exp(pi).data.cpu().numpy()[0], v.data.cpu().numpy()[0]
+        if self.cache is not None:
+            pi.flags.writeable = v.flags.writeable = False  # shared by every lookup
+            self.cache.put(key, (pi, v))
+        return pi, v
+
+    def predictBatch(self, boards):
+        """
+        Input:
+            boards: a list of boards in their canonical form.
+
+        Returns:
+            pis: a numpy array of the policy vectors of the boards, one row per
+                 board
+            vs: a numpy array of the values of the boards
+        """
+        pis = np.zeros((len(boards), self.action_size), dtype=np.float32)
+        vs = np.zeros(len(boards), dtype=np.float32)
+
+        # boards evaluated before
+        misses = list(range(len(boards)))
+        if self.cache is not None:
+            keys = [self.game.stringRepresentation(board) for board in boards]
+            misses = []
+            for i, key in enumerate(keys):
+                evaluation = self.cache.get(key)
+                if evaluation is None:
+                    misses.append(i)
+                else:
+                    pis[i], vs[i] = evaluation[0], evaluation[1][0]
+        if not misses:
+            return pis, vs
+
+        # preparing input
+        missed = torch.FloatTensor(np.array([boards[i] for i in misses]).astype(np.float64))
+        if args.cuda: missed = missed.contiguous().cuda()
+        missed = missed.view(len(misses), self.board_x, self.board_y)
+        self.nnet.eval()
+        with torch.no_grad():
+            pi, v = self.nnet(missed)
+
+        pis[misses] = torch.exp(pi).data.cpu().numpy()
+        vs[misses] = v.data.cpu().numpy()[:, 0]
+        if self.cache is not None:
+            for i in misses:
+                evaluation = (pis[i].copy(), vs[i:i+1].copy())
+                evaluation[0].flags.writeable = evaluation[1].flags.writeable = False
+                self.cache.put(keys[i], evaluation)
+        return pis, vs
 
     def loss_pi(self, targets, outputs):
         return -torch.sum(targets*outputs)/targets.size()[0]
@@ -173,3 +235,5 @@ class NNetWrapper(NeuralNet):
         map_location = None if args.cuda else 'cpu'
         checkpoint = torch.load(filepath, map_location=map_location)
         self.nnet.load_state_dict(checkpoint['state_dict'])
+        if self.cache is not None:
+            self.cache.clear()  # evaluations of the old weights
@@ -10,8 +10,24 @@ args = dotdict({
     'updateThreshold': 0.6,     # During arena playoff, new neural net will be accepted if threshold or more of games are won.
     'maxlenOfQueue': 200000,    # Number of game examples to train the neural networks.
     'numMCTSSims': 25,          # Number of games moves for MCTS to simulate.
+    'playoutCapProb': 1,        # Fraction of self-play moves searched with numMCTSSims and used for training (e.g. 0.25).
+    'numMCTSSimsFast': 5,       # Number of MCTS simulations of the other (cheap, not recorded) self-play moves.
     'arenaCompare': 40,         # Number of games to play during arena play to determine if new net will be accepted.
     'cpuct': 1,
+    'mctsBatchSize': 1,         # Number of MCTS leaf positions evaluated by the neural network in one batch.
+    'virtualLoss': 1,           # Virtual loss added to the paths of a batch while their leaves wait for evaluation.
+    'mctsMaxNodes': 200000,     # Maximum number of positions kept by an MCTS tree (least recently visited evicted first), None for unbounded.
+    'numMCTSWorkers': 1,        # Number of processes searching each move in parallel (root parallel MCTS, visit counts summed).
+    'mctsWorkerNoise': 0.25,    # Weight of the Dirichlet noise each worker mixes into its root policy, so the workers' trees differ.
+    'rootNoise': False,         # Mix Dirichlet noise into the root policy of self-play searches (any number of workers).
+    'mctsTimeBudget': None,     # Seconds of search per move instead of numMCTSSims simulations, None to run numMCTSSims.
+    'mctsEarlyStop': False,     # Stop searching a move once the most visited move can no longer be overtaken.
+    'mctsCacheBoards': False,   # Keep the board of every MCTS position, so revisited moves skip the game engine (more memory).
+    'mctsSymmetry': True,       # Search a position and its mirror image as one MCTS node (shared statistics and NN evaluations).
+    'gumbel': False,            # Search the root with Gumbel top-k sampling and sequential halving (policy targets valid with few sims).
+                                # Needs numMCTSWorkers 1, mctsBatchSize 1, no mctsTimeBudget and no mctsEarlyStop.
+    'gumbelTopK': 16,           # Number of root moves sampled for sequential halving.
+    'mctsStats': False,         # Time the parts of the MCTS search and print the totals after each self-play iteration.
 
     'checkpoint': './temp/',
     'load_model': False,
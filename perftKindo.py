@@ -0,0 +1,180 @@
+import sys
+import time
+from kindo.KindoGame import KindoGame
+from kindo.KindoBatchedGame import BatchedKindoGame
+
+import numpy as np
+
+"""
+use this script to check and benchmark the Kindo move generation (perft).
+Counts the leaf positions reachable in exactly d moves from the starting board
+and from stored midgame positions (a game that ends before d moves is not
+continued, as in self-play), compares the counts against the reference
+table below and reports the speed of get_legal_moves plus make_move/unmake_move
+(execute_move with undo) for each board engine.
+Engines with an incremental Zobrist hash (Board.get_zobrist_hash) also run
+perft with a transposition table: Kindo positions repeat (walls can be moved
+back), so the leaf count of a position reached again at the same depth is
+looked up instead of searched again.
+Also plays random games with BatchedKindoGame and checks its valid moves, game
+results and canonical boards against KindoGame.
+Exits with status 1 if any count differs from the reference table or the
+batched games differ from KindoGame.
+"""
+# Board sizes to run
+board_sizes = [4, 5]
+# Board engines to run (False: array Board, True: BitBoard)
+bitboard_engines = [False, True]
+# Run each position to the deepest reference depth with at most this many leaves
+max_leaves = 200000
+# Number of random games checked with BatchedKindoGame for each board size
+batched_games = 32
+
+# Reference positions: (name, player to move, packed board (see KindoGame.packBoard))
+# Midgame positions were reached by random play from the starting board, the
+# plyN positions with N > 20 are 3 moves before the end of such a game
+positions = {
+    4: [
+        ('start', 1, [-128, 0, 0, -61, 0, -128, 0, 0, 0, 0, -128, 0, -63, 0, 0, -128,
+            1, 1, 2, 1, -1, 0, 2, 1]),
+        ('ply6', -1, [-128, 0, 15, -61, 0, -128, 0, 3, 0, 0, -128, 0, -63, 13, 33, -128,
+            1, 0, 2, 3, -1, 1, 2, 3]),
+        ('ply12', 1, [-128, 35, 19, -61, 0, -128, 0, 15, 9, 17, -128, 0, -63, 1, 0, -128,
+            1, 1, 2, 4, -1, 0, 2, 4]),
+        ('ply20', 1, [-128, 0, 7, -61, 13, -128, 35, 19, 9, 0, -128, 11, -63, 13, 0, -125,
+            1, 1, 2, 4, -1, 0, 2, 6]),
+        ('ply104', 1, [-127, 3, 7, -61, 9, -127, 9, 19, 9, 35, -125, 7, -63, 35, 3, -125,
+            1, 1, 2, 6, -1, 0, 3, 10]),
+    ],
+    5: [
+        ('start', 1, [-128, 0, 0, 0, -61, 0, -128, 0, 0, 0, 0, 0, -128, 0, 0, 0, 0, 0, -128, 0,
+            -63, 0, 0, 0, -128, 1, 1, 2, 1, -1, 0, 2, 1]),
+        ('ply6', -1, [-128, 0, 0, 7, -61, 0, -128, 0, 35, 0, 0, 0, -128, 0, 0, 0, 0, 0, -128, 0,
+            -63, 13, 0, 0, -128, 1, 0, 2, 2, -1, 1, 2, 3]),
+        ('ply12', 1, [-93, 3, 3, 3, -61, 0, -93, 0, 0, 3, 1, 0, -128, 0, 0, 1, 0, 0, -128, 0,
+            -63, 9, 0, 0, -128, 1, 1, 2, 4, -1, 0, 2, 7]),
+        ('ply20', 1, [-128, 0, 0, 0, -61, 0, -128, 0, 19, 7, 0, 0, -128, 35, 3, 0, 5, 5, -127, 0,
+            -63, 5, 1, 0, -128, 1, 1, 2, 6, -1, 0, 2, 5]),
+        ('ply239', -1, [-125, 19, 11, 15, -61, 7, -127, 7, 13, 17, 9, 5, -125, 19, 9, 9, 9, 5, -127, 17,
+            -63, 9, 17, 13, -127, 1, 0, 2, 16, -1, 1, 2, 9]),
+    ],
+}
+
+# Reference leaf counts for depths 1, 2, 3, ... of each position
+reference = {
+    (4, 'start'): [2, 4, 28, 196, 1652, 13924, 146300],
+    (4, 'ply6'): [10, 110, 1260, 13971, 175753, 2151137],
+    (4, 'ply12'): [14, 196, 2827, 40677, 611905, 9144002],
+    (4, 'ply20'): [13, 221, 3820, 52248, 760029, 13236282],
+    (4, 'ply104'): [14, 392, 10587, 285943, 4029360],
+    (5, 'start'): [2, 4, 28, 196, 1652, 13924, 150332],
+    (5, 'ply6'): [11, 66, 550, 6800, 95950, 1020855],
+    (5, 'ply12'): [15, 315, 6718, 105065, 1763028],
+    (5, 'ply20'): [19, 356, 6824, 132572, 2740827],
+    (5, 'ply239'): [25, 1031, 42272, 1007012, 26105905],
+}
+
+
+def perft(b, player, depth, table=None):
+    '''
+    Returns the number of leaf positions reachable from board b in exactly depth
+    moves by player (the player to move) and the following players.
+    Terminal positions (see KindoGame.getGameEnded) have no moves
+    table: transposition table {(Zobrist hash, player, depth): leaves} filled
+    during the search, None to search without one
+    '''
+    if depth == 0:
+        return 1
+    if table is not None:
+        key = (b.get_zobrist_hash(), player, depth)
+        if key in table:
+            return table[key]
+    if b.king_captured(player) != 0 or b.walled_in(player) != 0:
+        return 0
+    leaves = 0
+    for move in b.get_legal_moves(player):
+        nextPlayer = b.make_move(move, player)
+        leaves += perft(b, nextPlayer, depth - 1, table)
+        b.unmake_move()
+    if table is not None:
+        table[key] = leaves
+    return leaves
+
+
+def check_batched(n, numGames, seed=0):
+    '''
+    Plays numGames random games at once with BatchedKindoGame and one by one with
+    KindoGame, returns True if the valid moves, game results and canonical boards
+    of every game are the same after every move (until the first game ends)
+    '''
+    rng = np.random.RandomState(seed)
+    g = KindoGame(n)
+    batched = BatchedKindoGame(n, numGames)
+    boards = [g.getInitBoard() for _ in range(numGames)]
+    players = [1] * numGames
+    validMoves, ended, canonicalBoards = (batched.getValidMoves(), batched.getGameEnded(),
+        batched.getCanonicalForms())
+    while True:
+        for i in range(numGames):
+            if not ((validMoves[i] == g.getValidMoves(boards[i], players[i])).all()
+                    and ended[i] == g.getGameEnded(boards[i], players[i])
+                    and (canonicalBoards[i] == g.getCanonicalForm(boards[i], players[i])).all()):
+                return False
+        if ended.any():
+            return True
+        actions = [rng.choice(np.flatnonzero(v)) for v in validMoves]
+        for i in range(numGames):
+            boards[i], players[i] = g.getNextState(boards[i], players[i], actions[i])
+        validMoves, ended, canonicalBoards = batched.step(actions)
+
+
+def run():
+    '''
+    Runs perft for every board size, engine and position, returns True if all
+    counts match the reference table
+    '''
+    passed = True
+    for n in board_sizes:
+        for bitboard in bitboard_engines:
+            g = KindoGame(n, bitboard=bitboard)
+            totalNodes = 0
+            totalTime = 0
+            for name, player, packed in positions[n]:
+                counts = reference[(n, name)]
+                # Deepest depth within max_leaves (at least depth 1)
+                depth = max([1] + [d + 1 for d, count in enumerate(counts) if count <= max_leaves])
+                b = g.getBoard(g.unpackBoard(np.array(packed, dtype=np.int8)))
+                start = time.time()
+                leaves = perft(b, player, depth)
+                elapsed = time.time() - start
+                # Every counted position at depths 1 to depth was made with make_move
+                nodes = sum(counts[:depth])
+                totalNodes += nodes
+                totalTime += elapsed
+                ok = leaves == counts[depth - 1]
+                passed = passed and ok
+                print("n={} {:<9} {:<6} depth {} leaves {:>8} (reference {:>8}) {}  {:>9.0f} nodes/s".format(
+                    n, g.Board.__name__, name, depth, leaves, counts[depth - 1],
+                    "ok" if ok else "MISMATCH", nodes / max(elapsed, 1e-9)))
+                if hasattr(b, 'get_zobrist_hash'):
+                    table = {}
+                    start = time.time()
+                    leaves = perft(b, player, depth, table)
+                    hashedTime = time.time() - start
+                    ok = leaves == counts[depth - 1]
+                    passed = passed and ok
+                    print("n={} {:<9} {:<6} depth {} leaves {:>8} with transposition table ({} entries) {}  {:.2f}s ({:.1f}x)".format(
+                        n, g.Board.__name__, name, depth, leaves, len(table),
+                        "ok" if ok else "MISMATCH", hashedTime, elapsed / max(hashedTime, 1e-9)))
+            print("n={} {:<9} total {} nodes in {:.2f}s, {:.0f} nodes/s".format(
+                n, g.Board.__name__, totalNodes, totalTime, totalNodes / max(totalTime, 1e-9)))
+        ok = check_batched(n, batched_games)
+        passed = passed and ok
+        print("n={} BatchedKindoGame {} random games {}".format(n, batched_games, "ok" if ok else "MISMATCH"))
+    return passed
+
+
+if __name__ == "__main__":
+    if not run():
+        print("Perft counts differ from the reference table or BatchedKindoGame differs from KindoGame")
+        sys.exit(1)
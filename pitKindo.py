@@ -35,7 +35,7 @@ rp = RandomPlayer(g).play
 #     n1.load_checkpoint('./pretrained_models/kindo/pytorch/','4x100x25_best.pth.tar')
 # else:
 #     n1.load_checkpoint('./pretrained_models/kindo/pytorch/','5x100x25_best.pth.tar')
-# args1 = dotdict({'numMCTSSims': 50, 'cpuct':1.0})
+# args1 = dotdict({'numMCTSSims': 50, 'cpuct':1.0, 'mctsMaxNodes': 200000, 'numMCTSWorkers': 1, 'mctsTimeBudget': None, 'mctsEarlyStop': True})
 # mcts1 = MCTS(g, n1, args1)
 # n1p = lambda x: np.argmax(mcts1.getActionProb(x, temp=0))
 
@@ -45,7 +45,7 @@ rp = RandomPlayer(g).play
 #     n2.load_checkpoint('./pretrained_models/kindo/pytorch/','4x100x25_best.pth.tar')
 # else:
 #     n2.load_checkpoint('./pretrained_models/kindo/pytorch/','5x100x25_best.pth.tar')
-# args2 = dotdict({'numMCTSSims': 50, 'cpuct': 1.0})
+# args2 = dotdict({'numMCTSSims': 50, 'cpuct': 1.0, 'mctsMaxNodes': 200000, 'numMCTSWorkers': 1, 'mctsTimeBudget': None, 'mctsEarlyStop': True})
 # mcts2 = MCTS(g, n2, args2)
 # n2p = lambda x: np.argmax(mcts2.getActionProb(x, temp=0))
 
@@ -1,3 +1,54 @@
+from collections import OrderedDict
+
 class dotdict(dict):
     def __getattr__(self, name):
         return self[name]
+
+
+class EvaluationCache():
+    """
+    Least recently used cache of neural network evaluations (pi, v) of boards,
+    keyed by their string representation (game.stringRepresentation). It
+    belongs to the neural network, so every MCTS (and episode) using the
+    network shares it; the network clears it whenever its weights change.
+    """
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.hits = 0       # number of lookups found in the cache
+        self.misses = 0     # number of lookups not found in the cache
+
+    def get(self, key):
+        """
+        Returns the evaluation stored for key (marking it as recently used), or
+        None if it is not in the cache.
+        """
+        evaluation = self.entries.get(key)
+        if evaluation is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return evaluation
+
+    def put(self, key, evaluation):
+        """
+        Stores evaluation for key, evicting the least recently used evaluation
+        if the cache is full.
+        """
+        self.entries[key] = evaluation
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes all evaluations (the hit and miss counts are kept).
+        """
+        self.entries.clear()
+
+    def getHitRate(self):
+        """
+        Returns the fraction of lookups found in the cache.
+        """
+        return self.hits/max(self.hits + self.misses, 1)